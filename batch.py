@@ -0,0 +1,73 @@
+"""This module contains the compile_files function, which compiles many source
+files in one process or one pool of processes."""
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from compiler import AssetDirectory, compile_source
+from parse import get_parser
+
+
+def expand_sources(patterns: list) -> list:
+    """Expands glob patterns into a sorted list of files. Patterns without
+    wildcards are kept as they are."""
+    sources = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            sources.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            sources.append(pattern)
+    return list(dict.fromkeys(sources))
+
+
+def output_path(source: str) -> str:
+    """Returns the path of the .sb3 file that source is compiled to."""
+    return os.path.splitext(source)[0] + ".sb3"
+
+
+def compile_file(source: str, options=None):
+    """Compiles a source file to a .sb3 file next to it and returns the time it
+    took and the error that occurred, if any."""
+    start = time.perf_counter()
+    try:
+        with open(source) as source_file:
+            source_code = source_file.read()
+        project = compile_source(
+            source_code,
+            AssetDirectory(os.path.dirname(os.path.abspath(source))),
+            options=options)
+        with open(output_path(source), "wb") as project_file:
+            project_file.write(project)
+    except Exception as error:  # pylint: disable=broad-except
+        return time.perf_counter() - start, f"{type(error).__name__}: {error}"
+    return time.perf_counter() - start, None
+
+
+def compile_files(sources: list, jobs=1, options=None) -> list:
+    """Compiles every source file and returns a list of (source, seconds, error)
+    tuples. With jobs > 1 the files are compiled by a pool of processes, each of
+    which loads the parser once."""
+    if jobs <= 1:
+        results = [compile_file(source, options) for source in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=get_parser) as executor:
+            results = list(
+                executor.map(compile_file, sources,
+                             [options] * len(sources)))
+    return [(source, *result) for source, result in zip(sources, results)]
+
+
+def print_summary(results: list, elapsed: float) -> int:
+    """Prints the time it took to compile each file and returns the number of
+    files that couldn't be compiled."""
+    width = max((len(source) for source, _, _ in results), default=0)
+    for source, seconds, error in results:
+        status = f"error: {error.splitlines()[0]}" if error \
+                else f"-> {output_path(source)}"
+        print(f"{source:<{width}} {seconds * 1000:>9.1f}ms  {status}")
+    failed = sum(1 for _, _, error in results if error)
+    print(f"Compiled {len(results) - failed}/{len(results)} files in "
+          f"{elapsed:.2f}s")
+    return failed
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""This module contains benchmarks for the compiler. Run it to check that
+optimizing and scratchifying scale linearly with the number of blocks and with
+how deeply they are nested."""
+import argparse
+import copy
+import time
+
+from optimize import optimize
+from passes import count_nodes
+from scratchify import scratchify
+
+
+def _program(blocks: int) -> dict:
+    """Returns the AST of a program whose only procedure compiles to roughly the
+    specified number of blocks."""
+    stmts = [{
+        "type": "data_setvariableto",
+        "name": "x",
+        "value": {
+            "type": "operator_add",
+            "NUM1": {
+                "type": "ident",
+                "name": "x"
+            },
+            "NUM2": i
+        }
+    } for i in range(blocks // 2)]
+    return {
+        "type": "program",
+        "stage": {
+            "type": "stage_def",
+            "costumes": [],
+            "procedures": [],
+            "variables": [],
+            "lists": []
+        },
+        "sprites": [{
+            "type": "sprite_def",
+            "name": "bench",
+            "costumes": [],
+            "variables": [{
+                "name": "x"
+            }],
+            "lists": [],
+            "procedures": [{
+                "type": "procedures_definition",
+                "name": "main",
+                "params": [],
+                "warp": "false",
+                "body": stmts
+            }]
+        }]
+    }
+
+
+def bench_scaling(sizes):
+    """Prints the time it takes to optimize and scratchify programs of different
+    sizes."""
+    print(f"{'blocks':>10} {'seconds':>10} {'us/block':>10}")
+    for size in sizes:
+        tree = _program(size)
+        start = time.perf_counter()
+        project = scratchify(optimize(tree))
+        elapsed = time.perf_counter() - start
+        blocks = len(project["targets"][1]["blocks"])
+        print(f"{blocks:>10} {elapsed:>10.3f} {elapsed / blocks * 1e6:>10.2f}")
+
+
+def _nested_program(depth: int) -> dict:
+    """Returns the AST of a program with an expression nested depth levels
+    deep."""
+    tree = _program(2)
+    value = {"type": "ident", "name": "x"}
+    for i in range(depth):
+        value = {"type": "operator_add", "NUM1": value, "NUM2": i}
+    tree["sprites"][0]["procedures"][0]["body"][0]["value"] = value
+    return tree
+
+
+def bench_depth(depths):
+    """Prints the time it takes to optimize and scratchify expressions nested
+    to different depths."""
+    print(f"{'depth':>10} {'seconds':>10} {'us/level':>10}")
+    for depth in depths:
+        tree = _nested_program(depth)
+        start = time.perf_counter()
+        scratchify(optimize(tree))
+        elapsed = time.perf_counter() - start
+        print(f"{depth:>10} {elapsed:>10.3f} {elapsed / depth * 1e6:>10.2f}")
+
+
+def _expression(depth: int):
+    """Returns an expression with 2**depth - 1 operators that can't be folded."""
+    if depth == 0:
+        return {"type": "ident", "name": "x"}
+    return {
+        "type": "operator_add",
+        "NUM1": _expression(depth - 1),
+        "NUM2": {
+            "type": "operator_multiply",
+            "NUM1": 2,
+            "NUM2": _expression(depth - 1)
+        } if depth > 1 else 1
+    }
+
+
+def bench_dispatch(repeat=5):
+    """Prints the time spent per node by the optimizer and per call by the
+    transformer's built-in function and procedure tables."""
+    # pylint: disable=import-outside-toplevel,protected-access
+    from transformer import ScratchTransformer
+
+    tree = _expression(14)
+    nodes = count_nodes(tree)
+    copies = [copy.deepcopy(tree) for _ in range(repeat)]
+    best = min(_timed(lambda tree=tree: optimize(tree)) for tree in copies)
+    print(f"optimize: {best / nodes * 1e9:.0f}ns per node")
+
+    calls = 20000
+    func_args = [{"name": "sqrt"}, {"args": [1]}]
+    proc_args = [{"name": "go_to_xy"}, {"args": [1, 2]}]
+    for name, method, args in (
+        ("_func_call", ScratchTransformer._func_call, func_args),
+        ("_procedures_call", ScratchTransformer._procedures_call, proc_args)):
+        best = min(
+            _timed(lambda: [method(args) for _ in range(calls)])
+            for _ in range(repeat))
+        print(f"{name}: {best / calls * 1e9:.0f}ns per call")
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    """Runs the benchmarks."""
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--max-blocks",
+                            type=int,
+                            default=1_000_000,
+                            help="the size of the largest program")
+    arg_parser.add_argument("--skip-scaling",
+                            action="store_true",
+                            help="only run the dispatch benchmark")
+    args = arg_parser.parse_args()
+
+    bench_dispatch()
+    if args.skip_scaling:
+        return
+
+    sizes = []
+    size = 1000
+    while size <= args.max_blocks:
+        sizes.append(size)
+        size *= 10
+    bench_scaling(sizes)
+    bench_depth(sizes)
+
+
+if __name__ == "__main__":
+    main()
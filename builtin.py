@@ -0,0 +1,72 @@
+"""This module contains the tables of built-in functions and procedures. They
+are built once, when the module is imported, and shared by the transformer
+and the optimizer."""
+import math
+
+# Maps the OPERATOR field of a mathop block to the function it computes
+MATH_OPERATORS = {
+    "abs": abs,
+    "floor": math.floor,
+    "ceiling": math.ceil,
+    "sqrt": math.sqrt,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "ln": math.log,
+    "log": math.log10,
+    "e ^": math.exp,
+    "10 ^": lambda x: 10**x,
+}
+
+# Maps the name of a math function to the OPERATOR field of its mathop block
+MATH_FUNCTIONS = {
+    **{operator: operator
+       for operator in MATH_OPERATORS if operator.isalpha()},
+    "exp": "e ^",
+    "pow": "10 ^",
+}
+
+# Maps the name of a function to the type of the node it is turned into, the
+# names of the inputs its arguments are passed to and any fields of the node.
+# join() takes any number of arguments and is handled by the transformer.
+FUNCTIONS = {
+    **{
+        name: ("mathop", ("NUM", ), {
+            "OPERATOR": operator
+        })
+        for name, operator in MATH_FUNCTIONS.items()
+    },
+    "random": ("operator_random", ("FROM", "TO"), {}),
+    "contains": ("operator_contains", ("STRING1", "STRING2"), {}),
+    "length": ("operator_length", ("STRING", ), {}),
+    "answer": ("sensing_answer", (), {}),
+    "timer": ("sensing_timer", (), {}),
+    "username": ("sensing_username", (), {}),
+    "mouse_x": ("sensing_mousex", (), {}),
+    "mouse_y": ("sensing_mousey", (), {}),
+    "round": ("operator_round", ("NUM", ), {}),
+}
+
+# Maps the name of a procedure to the type of the node it is turned into and
+# the names of the inputs its arguments are passed to
+PROCEDURES = {
+    "move_steps": ("motion_movesteps", ("STEPS", )),
+    "go_to_xy": ("motion_gotoxy", ("X", "Y")),
+    "turn_right": ("motion_turnright", ("DEGREES", )),
+    "turn_left": ("motion_turnleft", ("DEGREES", )),
+    "point_in_direction": ("motion_pointindirection", ("DIRECTION", )),
+    "glide_to_xy": ("motion_glidesecstoxy", ("X", "Y", "SECS")),
+    "if_on_edge_bounce": ("motion_ifonedgebounce", ()),
+    "wait": ("control_wait", ("DURATION", )),
+    "wait_until": ("control_wait_until", ("CONDITION", )),
+    "say": ("looks_say", ("MESSAGE", )),
+    "say_for_seconds": ("looks_sayforsecs", ("MESSAGE", "SECS")),
+    "ask": ("sensing_askandwait", ("QUESTION", )),
+    "pen_down": ("pen_pendown", ()),
+    "pen_up": ("pen_penup", ()),
+    "stamp": ("pen_stamp", ()),
+    "erase_all": ("pen_eraseall", ()),
+}
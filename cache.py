@@ -0,0 +1,129 @@
+"""This module contains helpers for the on-disk caches used by the compiler."""
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+
+def cache_dir(*parts) -> str:
+    """Returns the path of a cache directory, creating it if needed. The root
+    can be changed with the SCRATCH_COMPILER_CACHE environment variable."""
+    root = os.environ.get("SCRATCH_COMPILER_CACHE") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME")
+        or os.path.join(os.path.expanduser("~"), ".cache"),
+        "scratch-compiler")
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def content_hash(*parts) -> str:
+    """Returns a hex digest identifying the contents of parts, which may be
+    strings or bytes."""
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf8")
+        hasher.update(len(part).to_bytes(8, "little"))
+        hasher.update(part)
+    return hasher.hexdigest()
+
+
+def tree_hash(tree) -> str:
+    """Returns a hex digest identifying an AST. Trees that are nested too deeply
+    to be pickled are serialized with an explicit stack instead."""
+    try:
+        return content_hash(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+    except RecursionError:
+        pass
+    parts = []
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            parts.append(f"dict {len(item)}")
+            for key, value in reversed(item.items()):
+                stack.append(value)
+                stack.append(key)
+        elif isinstance(item, (list, tuple)):
+            parts.append(f"{type(item).__name__} {len(item)}")
+            stack.extend(reversed(item))
+        else:
+            parts.append(repr(item))
+    return content_hash(*parts)
+
+
+def procedure_cache(max_bytes=256 * 2**20, max_age=30 * 24 * 60 * 60):
+    """Returns the cache used for the blocks generated for procedures."""
+    return DiskCache("procedures", max_bytes, max_age)
+
+
+def build_cache(max_bytes=1024 * 2**20, max_age=30 * 24 * 60 * 60):
+    """Returns the cache used for whole .sb3 archives."""
+    return DiskCache("builds", max_bytes, max_age)
+
+
+class DiskCache:
+    """A directory of cached values, keyed on content hashes. Entries that
+    haven't been used for max_age seconds are removed by prune, as are the
+    least recently used entries while the cache is larger than max_bytes."""
+    def __init__(self, name: str, max_bytes: int, max_age: float):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._path = None
+
+    @property
+    def path(self) -> str:
+        """The directory the entries are stored in."""
+        if self._path is None:
+            self._path = cache_dir(self.name)
+        return self._path
+
+    def get(self, key: str):
+        """Returns the value stored for key, or None if there is none."""
+        file_name = os.path.join(self.path, key)
+        try:
+            with open(file_name, "rb") as file:
+                value = file.read()
+            os.utime(file_name)
+            return value
+        except OSError:
+            return None
+
+    def put(self, key: str, value: bytes):
+        """Stores value for key. Writes are atomic, so several processes can
+        share a cache."""
+        file_name = os.path.join(self.path, key)
+        temp_name = f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_name, "wb") as file:
+                file.write(value)
+            os.replace(temp_name, file_name)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """Evicts old entries and returns the number of entries removed."""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.path):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort(reverse=True)
+
+        removed = 0
+        total = 0
+        for mtime, size, path in entries:
+            total += size
+            if total > self.max_bytes or now - mtime > self.max_age:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
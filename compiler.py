@@ -0,0 +1,248 @@
+"""This module contains the compile_source function, which compiles source code
+to a scratch project in memory."""
+import glob
+import io
+import json
+import os
+import pickle
+import zipfile
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from hashlib import md5
+
+from cache import content_hash
+from parse import parse
+from passes import optimize_program, optimize_target
+from scratchify import assign_ids, make_project, scratchify_target
+from context import CompileContext
+
+COMPILER_DIR = os.path.dirname(os.path.abspath(__file__))
+RESOURCES_DIR = os.path.join(COMPILER_DIR, "resources")
+DEFAULT_COSTUME = "backdrop.svg"
+# Options that only affect how fast a program is compiled, not the result
+CACHE_OPTIONS = ("procedure_cache", "build_cache")
+# The earliest timestamp that zip files can store
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+
+class AssetDirectory(Mapping):
+    """A read-only mapping from asset file names to their contents, loaded
+    lazily from a directory."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def __getitem__(self, name: str) -> bytes:
+        try:
+            with open(os.path.join(self.path, name), "rb") as asset_file:
+                return asset_file.read()
+        except FileNotFoundError:
+            raise KeyError(name) from None
+
+    def __iter__(self):
+        return iter(os.listdir(self.path))
+
+    def __len__(self):
+        return len(os.listdir(self.path))
+
+
+@lru_cache(maxsize=None)
+def _default_costume_data() -> bytes:
+    with open(os.path.join(RESOURCES_DIR, DEFAULT_COSTUME), "rb") as file:
+        return file.read()
+
+
+def _costume(name: str, data: bytes, center=(0, 0)) -> dict:
+    asset_id = md5(data).hexdigest()
+    base_name, extension = os.path.splitext(name)
+    return {
+        "assetId": asset_id,
+        "name": os.path.basename(base_name),
+        "md5ext": f"{asset_id}{extension}",
+        "dataFormat": extension[1:],
+        "rotationCenterX": center[0],
+        "rotationCenterY": center[1]
+    }
+
+
+def add_costumes(project: dict, costume_lists: list, assets) -> dict:
+    """Fills in the costumes of every target and returns the files that have to
+    be stored in the archive."""
+    files = {}
+    for target, names in zip(project["targets"], costume_lists):
+        if names:
+            costumes = []
+            for name in names:
+                try:
+                    data = assets[name]
+                except KeyError:
+                    raise FileNotFoundError(
+                        f"Costume '{name}' does not exist") from None
+                costumes.append(_costume(name, data))
+                files[costumes[-1]["md5ext"]] = data
+        else:
+            data = _default_costume_data()
+            costumes = [_costume(DEFAULT_COSTUME, data, (240, 180))]
+            files[costumes[0]["md5ext"]] = data
+        target["costumes"] = costumes
+    return files
+
+
+def write_sb3(project: dict, files: dict) -> bytes:
+    """Returns the contents of a .sb3 archive containing project.json and the
+    asset files. The archive only depends on its contents, so compiling the
+    same program twice gives byte-identical files."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        entries = {
+            "project.json":
+            json.dumps(project, sort_keys=True,
+                       separators=(",", ":")).encode("utf8"),
+            **files
+        }
+        for name in sorted(entries):
+            info = zipfile.ZipInfo(name, ZIP_TIMESTAMP)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            archive.writestr(info, entries[name])
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def compiler_version() -> str:
+    """Returns a hash of the source files and resources of the compiler."""
+    contents = []
+    for name in sorted(glob.glob(os.path.join(COMPILER_DIR, "*.py"))) + [
+            os.path.join(COMPILER_DIR, "grammar.lark"),
+            os.path.join(RESOURCES_DIR, DEFAULT_COSTUME)
+    ]:
+        with open(name, "rb") as source_file:
+            contents.append(source_file.read())
+    return content_hash(*contents)
+
+
+def _build_key(source_code: str, options: dict) -> str:
+    output_options = sorted((name, repr(value))
+                            for name, value in options.items()
+                            if name not in CACHE_OPTIONS)
+    return content_hash(compiler_version(), source_code, repr(output_options))
+
+
+def _cached_build(build_cache, key: str, assets):
+    cached = build_cache.get(key)
+    if cached is None:
+        return None
+    cached = pickle.loads(cached)
+    for name, asset_hash in cached["assets"].items():
+        if name not in assets or md5(assets[name]).hexdigest() != asset_hash:
+            return None
+    return cached["sb3"]
+
+
+def compile_target(target: dict, stage: dict, index, options) -> dict:
+    """Optimizes and scratchifies one target of a program whose variables and
+    lists have been given IDs by assign_ids."""
+    return scratchify_target(optimize_target(target, options), stage, index,
+                             CompileContext(options))
+
+
+def _compile_job(job) -> dict:
+    return compile_target(*job)
+
+
+def shared_stage(stage: dict) -> dict:
+    """Returns what the sprites need of the stage: its variables and lists,
+    but not its procedures, since sprites can't call them. The lists are
+    copied, so the temporaries that compiling the stage adds to it aren't
+    seen by the sprites, whether they are compiled in the same process or
+    not."""
+    return {
+        **stage, "procedures": [],
+        "variables": list(stage["variables"]),
+        "lists": list(stage["lists"])
+    }
+
+
+def costume_lists(tree: dict) -> list:
+    """Returns the costume file names of every target in a parsed program."""
+    return [
+        tree["stage"]["costumes"], *(spr["costumes"] for spr in tree["sprites"])
+    ]
+
+
+def compile_tree(tree: dict, context=None, jobs=1) -> dict:
+    """Optimizes and scratchifies a parsed program and returns the contents of
+    project.json. With jobs > 1 the targets are compiled in parallel by a pool
+    of processes, which gives the same result as compiling them one by one."""
+    context = context or CompileContext()
+    tree = optimize_program(tree, context.options)
+    assign_ids(tree, context)
+    stage = tree["stage"]
+    shared = shared_stage(stage)
+    if jobs <= 1 or not tree["sprites"]:
+        return make_project([
+            compile_target(stage, stage, None, context.options),
+            *(compile_target(spr, shared, i, context.options)
+              for i, spr in enumerate(tree["sprites"]))
+        ])
+
+    work = [(stage, stage, None, context.options),
+            *((spr, shared, i, context.options)
+              for i, spr in enumerate(tree["sprites"]))]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return make_project(list(executor.map(_compile_job, work)))
+
+
+def compile_source(source_code: str,
+                   assets=None,
+                   debug_dir=None,
+                   jobs=1,
+                   options=None) -> bytes:
+    """Compiles source code to the contents of a .sb3 file. Costumes are looked
+    up by file name in the assets mapping. If debug_dir is given, the generated
+    project is also written to parsed.json in that directory. The options are
+    stored in the CompileContext of the compilation. If the "build_cache"
+    option is set, the archive is looked up there first, keyed on the source
+    code, the options, the assets that are used and the compiler itself. The
+    cache isn't used when the passes have to print reports."""
+    assets = assets or {}
+    options = options or {}
+    build_cache = options.get("build_cache")
+    # A cached build would skip the passes, and with them the reports they
+    # print and parsed.json
+    if debug_dir is not None or options.get("time_passes") \
+            or options.get("report_removed"):
+        build_cache = None
+    if build_cache is not None:
+        key = _build_key(source_code, options)
+        cached = _cached_build(build_cache, key, assets)
+        if cached is not None:
+            return cached
+
+    parsed = parse(source_code)
+    costumes = costume_lists(parsed)
+    parsed = compile_tree(parsed, CompileContext(options), jobs)
+
+    files = add_costumes(parsed, costumes, assets)
+
+    if debug_dir is not None:
+        try:
+            with open(os.path.join(debug_dir, "parsed.json"),
+                      "w") as parsed_json_file:
+                json.dump(parsed, parsed_json_file, indent="\t")
+        except ValueError:
+            print(parsed)
+
+    sb3 = write_sb3(parsed, files)
+    if build_cache is not None:
+        build_cache.put(
+            key,
+            pickle.dumps(
+                {
+                    "assets": {
+                        name: md5(assets[name]).hexdigest()
+                        for names in costumes for name in names
+                    },
+                    "sb3": sb3
+                }, pickle.HIGHEST_PROTOCOL))
+    return sb3
@@ -0,0 +1,228 @@
+"""This module contains the propagate_constants function, which replaces reads
+of variables that never change with their values, and the initialize_lists
+function, which turns code that fills lists with constants into the initial
+values of the lists."""
+from cse import expression_children
+from optimize import optimize
+from tree import walk
+from unused import is_entry_point
+
+
+def _scopes(stage: dict, target: dict) -> tuple:
+    """Returns what names refer to in a target, as dicts from names to
+    variables and lists: one for identifiers, changing variables and member
+    calls, where both can be used, one for setting variables and one for
+    indexing lists. Like in resolve.build_symbols, names in a sprite shadow
+    names in the stage and the first declaration of a name wins."""
+    names = {}
+    variables = {}
+    lists = {}
+    for scope in (stage, target):
+        for items, kind in ((scope["lists"], lists),
+                            (scope["variables"], variables)):
+            declared = {item["name"]: item for item in reversed(items)}
+            names.update(declared)
+            kind.update(declared)
+    return names, variables, lists
+
+
+def _read_name(node: dict, params: set, names: dict, lists: dict):
+    """Returns the variable or list that an expression reads directly, or
+    None."""
+    if node["type"] == "ident" and node["name"] not in params:
+        return names.get(node["name"])
+    if node["type"] == "data_itemoflist":
+        return lists.get(node["name"])
+    if node["type"] == "member_func_call":
+        lst = names.get(node["caller"])
+        if any(lst is item for item in lists.values()):
+            return lst
+    return None
+
+
+class _Uses:
+    """The places where each variable and list of a program is set, changed
+    and read, and where each procedure is called, by target. Variables and
+    lists are keyed by their ids."""
+    def __init__(self, tree: dict):
+        self.writes = {}
+        self.reads = {}
+        self.calls = {}
+        stage = tree["stage"]
+        for target in (stage, *tree["sprites"]):
+            scopes = _scopes(stage, target)
+            for proc in target["procedures"]:
+                params = {param["name"] for param in proc["params"]}
+                for index, stmt in enumerate(proc["body"]):
+                    self._add(target, proc, index, stmt, params, scopes)
+
+    def _write(self, item, target, proc, index, node):
+        if item is not None:
+            self.writes.setdefault(id(item), []).append(
+                (target, proc, index, node))
+
+    def _add(self, target, proc, index, top, params, scopes):
+        names, variables, lists = scopes
+        for node in walk(top):
+            if node["type"] == "data_setvariableto":
+                self._write(variables.get(node["name"]), target, proc, index,
+                            node)
+            elif node["type"] == "data_changevariableby":
+                self._write(names.get(node["name"]), target, proc, None, node)
+            elif node["type"] == "member_proc_call":
+                self._write(names.get(node["caller"]), target, proc, index,
+                            node)
+            elif node["type"] == "procedures_call":
+                self.calls.setdefault((id(target), node["name"]), []).append(
+                    (proc, index))
+            for container, key in expression_children(node):
+                item = _read_name(container[key], params, names, lists)
+                if item is not None:
+                    self.reads.setdefault(id(item), []).append(
+                        (target, proc, index, container, key))
+
+
+def _runs_after(write: tuple, uses: _Uses, entry_points) -> set:
+    """Returns the procedures of the target of a statement at the top level
+    of a procedure that can only run after it, since every call to them
+    comes after it. Without entry points every procedure can be run by
+    clicking it, so none of them can only run after it."""
+    if not entry_points:
+        return set()
+    target, proc, index, _ = write
+    after = set()
+    changed = True
+    while changed:
+        changed = False
+        for callee in target["procedures"]:
+            if callee is proc or id(callee) in after \
+                    or is_entry_point(target.get("name", "Stage"), callee,
+                                       entry_points):
+                continue
+            calls = uses.calls.get((id(target), callee["name"]), [])
+            if calls and all(
+                    caller is proc and call_index > index
+                    or id(caller) in after and caller is not callee
+                    for caller, call_index in calls):
+                after.add(id(callee))
+                changed = True
+    return after
+
+
+def _reads_after(write: tuple, reads: list, uses: _Uses,
+                 entry_points) -> list:
+    """Returns the reads that can only happen after a statement at the top
+    level of a procedure has run, since they are in the same target and
+    either come after it in the same procedure or are in procedures that can
+    only run after it."""
+    write_target, write_proc, write_index, _ = write
+    after = _runs_after(write, uses, entry_points)
+    return [
+        read for read in reads if read[0] is write_target and (
+            read[1] is write_proc and read[2] > write_index
+            or id(read[1]) in after)
+    ]
+
+
+def _remove_statements(tree: dict, removed: set):
+    """Removes the statements with the ids in removed from the top level of
+    every procedure."""
+    for target in (tree["stage"], *tree["sprites"]):
+        for proc in target["procedures"]:
+            proc["body"] = [
+                stmt for stmt in proc["body"] if id(stmt) not in removed
+            ]
+
+
+def propagate_constants(tree: dict, options: dict) -> dict:
+    """Replaces the reads of variables that are never set or changed with
+    their initial value, and the reads of variables that are set once to a
+    constant with the constant, where the read can only happen after the
+    variable is set. Every target is searched for statements that change a
+    variable, since the stage's variables can be changed by every sprite. If
+    every read is replaced, the statement that sets the variable is removed
+    too."""
+    entry_points = set(options.get("entry_points") or ())
+    uses = _Uses(tree)
+    removed = set()
+    for target in (tree["stage"], *tree["sprites"]):
+        for var in target["variables"]:
+            writes = uses.writes.get(id(var), [])
+            reads = uses.reads.get(id(var), [])
+            if not writes:
+                for _, _, _, container, key in reads:
+                    container[key] = var.get("value", 0)
+                continue
+            if len(writes) > 1:
+                continue
+            write_proc, write_index, stmt = writes[0][1:]
+            # Only a statement at the top level of a procedure is known to
+            # have run before the statements after it
+            if write_index is None \
+                    or write_proc["body"][write_index] is not stmt:
+                continue
+            value = stmt["value"] = optimize(stmt["value"])
+            if isinstance(value, dict):
+                continue
+
+            replaced = _reads_after(writes[0], reads, uses, entry_points)
+            for _, _, _, container, key in replaced:
+                container[key] = value
+            if len(replaced) == len(reads):
+                removed.add(id(stmt))
+
+    _remove_statements(tree, removed)
+    return tree
+
+
+def _fill(writes: list) -> list:
+    """Returns the items that the statements that change a list fill it with,
+    if they are a clear followed by appends of constants, in a row at the top
+    level of one procedure, or None."""
+    target, proc, first, _ = writes[0]
+    if first is None:
+        return None
+    items = []
+    for offset, (write_target, write_proc, index, stmt) in enumerate(writes):
+        if write_target is not target or write_proc is not proc \
+                or index != first + offset or proc["body"][index] is not stmt:
+            return None
+        if offset == 0:
+            if stmt["name"] != "clear" or stmt["args"]:
+                return None
+            continue
+        if stmt["name"] != "append" or len(stmt["args"]) != 1:
+            return None
+        value = stmt["args"][0] = optimize(stmt["args"][0])
+        if isinstance(value, dict):
+            return None
+        items.append(value)
+    return items
+
+
+def initialize_lists(tree: dict, options: dict) -> dict:
+    """Turns the statements that fill a list with constants into the initial
+    value of the list, so that the project starts with the items instead of
+    appending them one by one. This is only done for lists that are changed
+    by nothing but a clear followed by the appends, and are only read after
+    the last append, like for propagate_constants. Without entry points, that
+    means later in the procedure that fills the list."""
+    entry_points = set(options.get("entry_points") or ())
+    uses = _Uses(tree)
+    removed = set()
+    for target in (tree["stage"], *tree["sprites"]):
+        for lst in target["lists"]:
+            writes = uses.writes.get(id(lst))
+            if not writes:
+                continue
+            items = _fill(writes)
+            if items is None:
+                continue
+            reads = uses.reads.get(id(lst), [])
+            if len(_reads_after(writes[-1], reads, uses,
+                                entry_points)) == len(reads):
+                lst["value"] = items
+                removed.update(id(stmt) for *_, stmt in writes)
+
+    _remove_statements(tree, removed)
+    return tree
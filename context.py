@@ -0,0 +1,45 @@
+"""This module contains the CompileContext class, which holds the state of a
+single compilation."""
+import itertools
+
+from resolve import build_symbols
+
+
+class CompileContext:
+    """Owns everything that is shared between the parts of one compilation: ID
+    allocation, the environments of the targets and the compiler options.
+    Every compilation should use its own context, so that compilations running
+    in the same process don't affect each other."""
+    def __init__(self, options=None, prefix=""):
+        self.options = dict(options or {})
+        self.targets = {}
+        self.prefix = prefix
+        self._ids = itertools.count()
+
+    def new_id(self) -> str:
+        """Returns an ID that hasn't been used before in this compilation."""
+        return f"{self.prefix}_{next(self._ids)}"
+
+    def child(self, prefix: str):
+        """Returns a context that shares everything with this one, except that
+        it gives out IDs in its own namespace."""
+        context = CompileContext(self.options, prefix)
+        context.targets = self.targets
+        return context
+
+    def target_env(self, stage: dict, sprite: dict, index=None) -> dict:
+        """Returns the environment used when scratchifying a target, including
+        its symbol table. Each target gets its own ID namespace, so the IDs in
+        a target don't depend on the targets that were scratchified before
+        it."""
+        context = self.child(f"_{0 if index is None else index + 1}")
+        env = {
+            "context": context,
+            "stage": stage,
+            "sprite": sprite,
+            "symbols": build_symbols(stage, sprite)
+        }
+        if index is not None:
+            env["index"] = index
+        self.targets[sprite.get("name", "Stage")] = env
+        return env
@@ -0,0 +1,166 @@
+"""This module contains the eliminate_common_subexpressions function, which
+computes expressions that are used several times in a row only once and keeps
+their values in temporary variables."""
+from effects import WRITES
+from tree import STATEMENT_LISTS, add_temporary, statement_lists, walk
+
+# Expressions of these types always give the same value for the same inputs
+# and variables. timer(), mouse_x(), mouse_y() and random() are left out,
+# since they can give a new value every time they are evaluated.
+PURE_EXPRESSIONS = {
+    "operator_add", "operator_subtract", "operator_multiply",
+    "operator_divide", "operator_mod", "operator_equals", "operator_gt",
+    "operator_lt", "operator_and", "operator_or", "operator_not",
+    "operator_join", "operator_length", "operator_contains", "operator_round",
+    "mathop", "ident", "data_itemoflist", "sensing_answer", "sensing_username"
+}
+
+# Statements that don't change any variables or lists
+_NO_WRITES = {
+    "looks_say", "motion_movesteps", "motion_gotoxy", "motion_turnright",
+    "motion_turnleft", "motion_pointindirection", "motion_ifonedgebounce",
+    "pen_pendown", "pen_penup", "pen_stamp", "pen_eraseall"
+}
+
+
+def expression_children(node: dict) -> list:
+    """Returns a (container, key) pair for each expression that is an input
+    of a node."""
+    children = []
+    for key, value in node.items():
+        if isinstance(value, dict):
+            children.append((node, key))
+        elif isinstance(value, list) and key not in STATEMENT_LISTS.get(
+                node["type"], ()):
+            children.extend((value, i) for i in range(len(value))
+                            if isinstance(value[i], dict))
+    return children
+
+
+def analyze_expressions(roots: list, keys: dict) -> list:
+    """Returns the pure expressions in the expressions at the (container, key)
+    pairs in roots that are worth computing only once, as (container, key,
+    node, structure, names, size) tuples, inner expressions first.
+    Expressions with the same structure are equal, and names are the
+    variables and lists they read. keys maps structures to numbers and should
+    be shared by the expressions that are compared."""
+    candidates = []
+    # The structure, purity, names read and size of each visited node
+    info = {}
+    stack = [(container, key, False) for container, key in roots]
+    while stack:
+        container, key, visited = stack.pop()
+        node = container[key]
+        if not visited:
+            stack.append((container, key, True))
+            stack.extend((child_container, child_key, False)
+                         for child_container, child_key in
+                         expression_children(node))
+            continue
+
+        parts = [node["type"]]
+        pure = node["type"] in PURE_EXPRESSIONS
+        names = set()
+        size = 1
+        if node["type"] in ("ident", "data_itemoflist"):
+            names.add(node["name"])
+        for child_key, value in node.items():
+            if child_key == "type":
+                continue
+            if isinstance(value, (dict, list)):
+                items = [value] if isinstance(value, dict) else value
+                parts.append((child_key, *(info[id(item)][0] if isinstance(
+                    item, dict) else repr(item) for item in items)))
+                for item in items:
+                    if isinstance(item, dict):
+                        _, child_pure, child_names, child_size = info[id(item)]
+                        pure = pure and child_pure
+                        names |= child_names
+                        size += child_size
+            else:
+                parts.append((child_key, repr(value)))
+        structure = keys.setdefault(tuple(parts), len(keys))
+        info[id(node)] = (structure, pure, names, size)
+        if pure and size > 1:
+            candidates.append((container, key, node, structure, names, size))
+    return candidates
+
+
+def _eliminate_in_list(stmts: list, target: dict, keys: dict) -> list:
+    # A group is the list of occurrences of an expression that can share one
+    # value, since nothing it reads changes in between
+    groups = {}
+    finished = []
+    for index, stmt in enumerate(stmts):
+        if not isinstance(stmt, dict) or stmt["type"] in STATEMENT_LISTS:
+            # The branches and loop bodies get their own groups
+            finished.extend(groups.values())
+            groups = {}
+            continue
+        for container, key, node, structure, names, size in \
+                analyze_expressions(expression_children(stmt), keys):
+            group = groups.setdefault(structure, {
+                "names": names,
+                "size": size,
+                "occurrences": []
+            })
+            group["occurrences"].append((index, container, key, node))
+
+        if stmt["type"] in WRITES:
+            written = stmt[WRITES[stmt["type"]]]
+            for structure, group in list(groups.items()):
+                if written in group["names"]:
+                    finished.append(group)
+                    del groups[structure]
+        elif stmt["type"] not in _NO_WRITES:
+            # Procedure calls and blocks that wait can change anything
+            finished.extend(groups.values())
+            groups = {}
+    finished.extend(groups.values())
+
+    # Larger expressions are replaced first. The first occurrence of an
+    # expression is moved into the definition of its temporary, where the
+    # expressions inside it can still be replaced, but the expressions inside
+    # the other occurrences are gone.
+    inserted = {}
+    replaced = set()
+    for group in sorted(finished, key=lambda group: -group["size"]):
+        occurrences = [
+            occurrence for occurrence in group["occurrences"]
+            if id(occurrence[3]) not in replaced
+        ]
+        if len(occurrences) < 2:
+            continue
+        name = add_temporary(target, "cse")
+        # A temporary for a smaller expression can be used in the definitions
+        # that are already there, so it has to come before them
+        inserted.setdefault(occurrences[0][0], []).insert(
+            0, {
+                "type": "data_setvariableto",
+                "name": name,
+                "value": occurrences[0][3]
+            })
+        for i, (_, container, key, node) in enumerate(occurrences):
+            if i > 0:
+                replaced.update(id(inner) for inner in walk(node))
+            container[key] = {"type": "ident", "name": name}
+
+    if not inserted:
+        return stmts
+    eliminated = []
+    for index, stmt in enumerate(stmts):
+        eliminated.extend(inserted.get(index, ()))
+        eliminated.append(stmt)
+    return eliminated
+
+
+def eliminate_common_subexpressions(target: dict) -> dict:
+    """Finds pure expressions that are computed more than once in a row of
+    statements, without anything they read changing in between. Each one is
+    computed once into a temporary variable of the target, which is used
+    instead. Rows end at branches, loops, procedure calls and blocks that
+    wait, since other scripts can run or variables can change there."""
+    keys = {}
+    for node, key in statement_lists(target["procedures"]):
+        node[key] = _eliminate_in_list(node[key], target, keys)
+    return target
@@ -0,0 +1,67 @@
+"""This module contains the eliminate_dead_code function, which removes
+statements that can never run or that have no effect from a stage or a
+sprite."""
+from tree import statement_lists
+
+
+def _control_if(node):
+    return node if node["true_branch"] else None
+
+
+def _control_if_else(node):
+    if not node["false_branch"]:
+        return _control_if({
+            "type": "control_if",
+            "CONDITION": node["CONDITION"],
+            "true_branch": node["true_branch"]
+        })
+    if not node["true_branch"]:
+        return {
+            "type": "control_if",
+            "CONDITION": {
+                "type": "operator_not",
+                "OPERAND": node["CONDITION"]
+            },
+            "true_branch": node["false_branch"]
+        }
+    return node
+
+
+def _control_repeat(node):
+    # Expressions have no side effects, so an empty repeat loop does nothing
+    # but wait for a few frames
+    return node if node["body"] else None
+
+
+# Empty while and until loops are kept, since they wait for their condition
+_SIMPLIFY_DICT = {
+    "control_if": _control_if,
+    "control_if_else": _control_if_else,
+    "control_repeat": _control_repeat,
+}
+
+
+def _eliminate_in_list(stmts: list) -> list:
+    eliminated = []
+    for stmt in stmts:
+        if stmt is None:
+            continue
+        if stmt["type"] in _SIMPLIFY_DICT:
+            stmt = _SIMPLIFY_DICT[stmt["type"]](stmt)
+            if stmt is None:
+                continue
+        eliminated.append(stmt)
+        # Nothing after a forever loop can run
+        if stmt["type"] == "control_forever":
+            break
+    return eliminated
+
+
+def eliminate_dead_code(target: dict) -> dict:
+    """Removes the statements in the procedures of a target that are left
+    over from constant folding, can't be reached or have no effect. Inner
+    statement lists are cleaned up before the ones containing them, so that
+    statements that become empty are removed as well."""
+    for node, key in reversed(statement_lists(target["procedures"])):
+        node[key] = _eliminate_in_list(node[key])
+    return target
@@ -0,0 +1,79 @@
+"""This module contains functions that find out which variables and lists
+statements and procedures can change, which procedures they call and whether
+they can wait."""
+from tree import walk
+
+# Maps the type of a statement to the key of the variable or list it changes
+WRITES = {
+    "data_setvariableto": "name",
+    "data_changevariableby": "name",
+    "member_proc_call": "caller",
+}
+
+# Statements that can make the script wait, letting other scripts run
+WAITING_STATEMENTS = {
+    "control_wait", "control_wait_until", "sensing_askandwait",
+    "looks_sayforsecs", "motion_glidesecstoxy"
+}
+
+
+def reads(expression) -> set:
+    """Returns the names of the variables and lists that an expression
+    reads."""
+    return {
+        node["name"]
+        for node in walk(expression)
+        if node["type"] in ("ident", "data_itemoflist")
+    }
+
+
+def statement_effects(stmts) -> dict:
+    """Returns the names of the variables and lists that statements change
+    themselves, the names of the procedures they call and whether they wait
+    themselves."""
+    writes = set()
+    calls = set()
+    waits = False
+    for node in walk(stmts):
+        if node["type"] in WRITES:
+            writes.add(node[WRITES[node["type"]]])
+        elif node["type"] == "procedures_call":
+            calls.add(node["name"])
+        elif node["type"] in WAITING_STATEMENTS:
+            waits = True
+    return {"writes": writes, "calls": calls, "waits": waits}
+
+
+def procedure_effects(procedures: list) -> dict:
+    """Returns the effects of each procedure by name, including the effects of
+    the procedures it calls. "calls" holds every procedure that can be reached,
+    which includes the procedure itself if it is recursive. If a procedure
+    that doesn't exist can be reached, "writes" is None and "waits" is True,
+    since it could do anything."""
+    direct = {
+        proc["name"]: statement_effects(proc["body"])
+        for proc in procedures
+    }
+    effects = {}
+    for name, own in direct.items():
+        reached = set()
+        stack = list(own["calls"])
+        while stack:
+            callee = stack.pop()
+            if callee in reached:
+                continue
+            reached.add(callee)
+            if callee in direct:
+                stack.extend(direct[callee]["calls"])
+
+        writes = set(own["writes"])
+        waits = own["waits"]
+        for callee in reached:
+            if callee not in direct:
+                writes = None
+                waits = True
+                break
+            writes |= direct[callee]["writes"]
+            waits = waits or direct[callee]["waits"]
+        effects[name] = {"writes": writes, "calls": reached, "waits": waits}
+    return effects
@@ -0,0 +1,149 @@
+"""This module contains the evaluate_calls function, which runs calls to
+procedures with constant arguments at compile time if all they do is compute
+the values of variables."""
+import math
+
+from cast import to_bool, to_number
+from cse import expression_children
+from optimize import optimize
+from tree import copy_tree, statement_lists, walk
+
+# The largest number of statements and loop iterations run to evaluate one
+# call
+DEFAULT_BUDGET = 10000
+
+
+class _Unknown(Exception):
+    """Raised when a call can't be evaluated at compile time."""
+
+
+def _evaluate(expression, params: dict, variables: dict):
+    """Returns the value of an expression, using the same folding and casts
+    as optimize."""
+    if not isinstance(expression, dict):
+        return expression
+    root = [copy_tree(expression)]
+    for node in [None, *walk(root[0])]:
+        children = [(root, 0)] if node is None else expression_children(node)
+        for container, key in children:
+            child = container[key]
+            if not isinstance(child, dict) or child["type"] != "ident":
+                continue
+            if child["name"] in params:
+                container[key] = params[child["name"]]
+            elif child["name"] in variables:
+                container[key] = variables[child["name"]]
+            else:
+                raise _Unknown
+    try:
+        value = optimize(root[0])
+    except (ArithmeticError, ValueError, TypeError) as error:
+        raise _Unknown from error
+    if isinstance(value, dict):
+        raise _Unknown
+    return value
+
+
+def _run(call: dict, procs: dict, budget: int) -> dict:
+    """Runs a call and returns the values of the variables it set. Raises
+    _Unknown if the call reads a variable it didn't set itself, does anything
+    but setting variables or runs more than budget statements. Uses an
+    explicit stack, where an entry is a list of the statements left to run,
+    a loop or a repeat loop with its remaining count, and the parameters."""
+    variables = {}
+    stack = [(iter([call]), None, {})]
+    steps = 0
+    while stack:
+        item, remaining, params = stack[-1]
+        steps += 1
+        if steps > budget:
+            raise _Unknown
+        if isinstance(item, dict):
+            # A loop runs its body again until it is done
+            if item["type"] == "control_repeat":
+                if remaining <= 0:
+                    stack.pop()
+                    continue
+                stack[-1] = (item, remaining - 1, params)
+            elif to_bool(_evaluate(item["CONDITION"], params, variables)) \
+                    == (item["type"] == "control_repeat_until"):
+                stack.pop()
+                continue
+            stack.append((iter(item["body"]), None, params))
+            continue
+
+        stmt = next(item, None)
+        if stmt is None:
+            stack.pop()
+            continue
+
+        if stmt["type"] == "data_setvariableto":
+            variables[stmt["name"]] = _evaluate(stmt["value"], params,
+                                                variables)
+        elif stmt["type"] == "data_changevariableby":
+            if stmt["name"] not in variables:
+                raise _Unknown
+            variables[stmt["name"]] = to_number(
+                variables[stmt["name"]]) + to_number(
+                    _evaluate(stmt["value"], params, variables))
+        elif stmt["type"] == "control_if":
+            if to_bool(_evaluate(stmt["CONDITION"], params, variables)):
+                stack.append((iter(stmt["true_branch"]), None, params))
+        elif stmt["type"] == "control_if_else":
+            branch = "true_branch" if to_bool(
+                _evaluate(stmt["CONDITION"], params,
+                          variables)) else "false_branch"
+            stack.append((iter(stmt[branch]), None, params))
+        elif stmt["type"] == "control_repeat":
+            # Scratch rounds the number of repetitions
+            times = math.floor(
+                to_number(_evaluate(stmt["TIMES"], params, variables)) + 0.5)
+            stack.append((stmt, times, params))
+        elif stmt["type"] in ("control_while", "control_repeat_until"):
+            stack.append((stmt, None, params))
+        elif stmt["type"] == "procedures_call" and stmt["name"] in procs:
+            proc = procs[stmt["name"]]
+            if len(stmt["args"]) != len(proc["params"]):
+                raise _Unknown
+            stack.append((iter(proc["body"]), None, {
+                param["name"]: _evaluate(arg, params, variables)
+                for param, arg in zip(proc["params"], stmt["args"])
+            }))
+        else:
+            raise _Unknown
+    return variables
+
+
+def evaluate_calls(target: dict, budget=DEFAULT_BUDGET) -> dict:
+    """Replaces calls with constant arguments to procedures that only set
+    variables, and only read variables they have set themselves, with
+    statements that set the variables to their final values. The temporary
+    variables of the compiler are left out, since they are never read after
+    the code that sets them."""
+    procs = {proc["name"]: proc for proc in target["procedures"]}
+    results = {}
+    for node, key in statement_lists(target["procedures"]):
+        evaluated = []
+        for stmt in node[key]:
+            if not isinstance(stmt, dict) \
+                    or stmt["type"] != "procedures_call" \
+                    or stmt["name"] not in procs \
+                    or any(isinstance(arg, dict) for arg in stmt["args"]):
+                evaluated.append(stmt)
+                continue
+            call_key = (stmt["name"], *map(repr, stmt["args"]))
+            if call_key not in results:
+                try:
+                    results[call_key] = _run(stmt, procs, budget)
+                except _Unknown:
+                    results[call_key] = None
+            if results[call_key] is None:
+                evaluated.append(stmt)
+                continue
+            evaluated.extend({
+                "type": "data_setvariableto",
+                "name": name,
+                "value": value
+            } for name, value in results[call_key].items() if "." not in name)
+        node[key] = evaluated
+    return target
@@ -0,0 +1,142 @@
+"""This module contains the inline_procedures function, which replaces calls to
+small procedures with their bodies."""
+from cse import PURE_EXPRESSIONS, expression_children
+from effects import procedure_effects, reads
+from licm import LOOPS
+from tree import add_temporary, copy_tree, statement_lists, walk
+
+# The largest number of nodes a procedure can have in its body to be inlined
+DEFAULT_BUDGET = 12
+
+
+def _can_yield(body: list, callee_effects: dict, caller: dict) -> bool:
+    """Returns whether other scripts can run while the body of a procedure
+    runs in the caller. Loops and calls only let them run if the caller isn't
+    a warp procedure."""
+    if callee_effects["waits"]:
+        return True
+    return caller["warp"] != "true" and any(
+        node["type"] in LOOPS or node["type"] == "procedures_call"
+        for node in walk(body))
+
+
+def _needs_temporary(arg, uses: int, callee_effects: dict,
+                     can_yield: bool) -> bool:
+    """Returns whether an argument has to be computed into a temporary. Other
+    arguments are substituted for the parameter, which is only done for
+    larger expressions if the parameter is used at most once, so that they
+    aren't computed more often than before. If other scripts can run during
+    the body, only literals can be substituted."""
+    if not isinstance(arg, dict):
+        return False
+    return can_yield or not (arg["type"] == "ident" or uses <= 1) \
+        or any(node["type"] not in PURE_EXPRESSIONS for node in walk(arg)) \
+        or bool(reads(arg) & callee_effects["writes"])
+
+
+def _arguments(call: dict, callee: dict, needed: list, target: dict):
+    """Returns what each parameter of the callee is replaced with and the
+    statements that compute the arguments that need temporaries."""
+    values = {}
+    definitions = []
+    for param, arg, needs_temporary in zip(callee["params"], call["args"],
+                                           needed):
+        if not needs_temporary:
+            values[param["name"]] = arg
+            continue
+        name = add_temporary(target, "inline")
+        definitions.append({
+            "type": "data_setvariableto",
+            "name": name,
+            "value": arg
+        })
+        values[param["name"]] = {"type": "ident", "name": name}
+    return values, definitions
+
+
+def _substitute(stmts: list, values: dict):
+    # The nodes are collected first, so that the arguments aren't substituted
+    # into themselves
+    for node in list(walk(stmts)):
+        for container, key in expression_children(node):
+            child = container[key]
+            if child["type"] == "ident" and child["name"] in values:
+                container[key] = copy_tree(values[child["name"]])
+
+
+def _inline_call(call: dict, caller: dict, callees: dict, effects: dict,
+                 target: dict):
+    """Returns the statements that replace a call, or None if it has to stay
+    a call."""
+    callee = callees.get(call["name"])
+    if callee is None or callee is caller \
+            or len(call["args"]) != len(callee["params"]):
+        return None
+    # The body of a nowarp procedure would run without screen refresh in a
+    # warp caller, and any other caller could still be made warp later
+    if callee.get("nowarp") and not caller.get("nowarp"):
+        return None
+    callee_effects = effects[callee["name"]]
+    if callee_effects["writes"] is None \
+            or callee["name"] in callee_effects["calls"]:
+        return None
+
+    # The parameters of the caller would shadow the names used in the callee
+    shadowed = {param["name"] for param in caller["params"]} - {
+        param["name"]
+        for param in callee["params"]
+    }
+    if any(node["type"] == "ident" and node["name"] in shadowed
+           for node in walk(callee["body"])):
+        return None
+
+    uses = {}
+    for node in walk(callee["body"]):
+        if node["type"] == "ident":
+            uses[node["name"]] = uses.get(node["name"], 0) + 1
+    can_yield = _can_yield(callee["body"], callee_effects, caller)
+    needed = [
+        _needs_temporary(arg, uses.get(param["name"], 0), callee_effects,
+                         can_yield)
+        for param, arg in zip(callee["params"], call["args"])
+    ]
+    # A warp procedure that could yield in the caller has to stay warp, and
+    # another script running the same code could overwrite the temporaries
+    if can_yield and (callee["warp"] == "true" or any(needed)):
+        return None
+
+    values, definitions = _arguments(call, callee, needed, target)
+    body = copy_tree(callee["body"])
+    _substitute(body, values)
+    return definitions + body
+
+
+def inline_procedures(target: dict, budget=DEFAULT_BUDGET) -> dict:
+    """Replaces the calls to procedures of a target that aren't recursive and
+    have at most budget nodes in their bodies with the bodies, where the
+    parameters are replaced with the arguments or with temporary variables
+    that hold them. The procedures themselves are kept, since they can still
+    be run by clicking them."""
+    callees = {
+        proc["name"]: proc
+        for proc in target["procedures"]
+        if sum(1 for _ in walk(proc["body"])) <= budget
+    }
+    if not callees:
+        return target
+    effects = procedure_effects(target["procedures"])
+    for caller in target["procedures"]:
+        for node, key in statement_lists([caller]):
+            inlined = []
+            for stmt in node[key]:
+                replacement = None
+                if isinstance(stmt, dict) \
+                        and stmt["type"] == "procedures_call":
+                    replacement = _inline_call(stmt, caller, callees,
+                                               effects, target)
+                if replacement is None:
+                    inlined.append(stmt)
+                else:
+                    inlined.extend(replacement)
+            node[key] = inlined
+    return target
@@ -0,0 +1,107 @@
+"""This module contains the hoist_loop_invariants function, which computes the
+expressions that don't change inside a loop once, before the loop."""
+from cse import analyze_expressions, expression_children
+from effects import procedure_effects, reads, statement_effects
+from tree import add_temporary, statement_lists, walk
+
+LOOPS = {
+    "control_repeat", "control_while", "control_repeat_until",
+    "control_forever"
+}
+
+
+def _loop_writes(loop: dict, proc_name: str, effects: dict):
+    """Returns the names of the variables and lists that a loop can change, or
+    None if nothing can be moved out of it. That is the case if the loop can
+    wait, since other scripts can change anything then, and if it can call
+    the procedure it is in, since that would overwrite the temporaries."""
+    own = statement_effects(loop["body"])
+    if own["waits"]:
+        return None
+    writes = set(own["writes"])
+    for callee in own["calls"]:
+        callee_effects = effects.get(callee)
+        if callee == proc_name or callee_effects is None \
+                or callee_effects["writes"] is None \
+                or callee_effects["waits"] \
+                or proc_name in callee_effects["calls"]:
+            return None
+        writes |= callee_effects["writes"]
+    return writes
+
+
+def _hoist(loop: dict, proc_name: str, effects: dict, target: dict,
+           keys: dict) -> list:
+    """Replaces the invariant expressions in a loop with temporaries and
+    returns the statements that compute them, which go before the loop."""
+    writes = _loop_writes(loop, proc_name, effects)
+    if writes is None:
+        return []
+
+    # Temporaries that were moved out of inner loops can be moved further out
+    # if this loop doesn't change what they read either
+    hoisted = []
+    for node, key in statement_lists([loop]):
+        kept = []
+        for stmt in node[key]:
+            if isinstance(stmt, dict) \
+                    and stmt["type"] == "data_setvariableto" \
+                    and stmt["name"].startswith("licm.") \
+                    and not reads(stmt["value"]) & writes:
+                hoisted.append(stmt)
+                writes.discard(stmt["name"])
+            else:
+                kept.append(stmt)
+        node[key] = kept
+
+    roots = [(loop, "CONDITION")] if "CONDITION" in loop else []
+    for node, key in statement_lists([loop]):
+        for stmt in node[key]:
+            if isinstance(stmt, dict):
+                roots.extend(expression_children(stmt))
+
+    # The largest invariant expressions are moved, and equal expressions
+    # share a temporary
+    temporaries = {}
+    moved = set()
+    for container, key, node, structure, names, _ in reversed(
+            analyze_expressions(roots, keys)):
+        if names & writes or id(node) in moved:
+            continue
+        if structure not in temporaries:
+            temporaries[structure] = add_temporary(target, "licm")
+            hoisted.append({
+                "type": "data_setvariableto",
+                "name": temporaries[structure],
+                "value": node
+            })
+        moved.update(id(inner) for inner in walk(node))
+        container[key] = {"type": "ident", "name": temporaries[structure]}
+    return hoisted
+
+
+def hoist_loop_invariants(target: dict) -> dict:
+    """Moves the pure expressions that can't change while a loop runs out of
+    the loop, into temporary variables that are set right before it. Only
+    loops in warp procedures are changed, since other loops let other scripts
+    run between iterations."""
+    effects = procedure_effects(target["procedures"])
+    keys = {}
+    for proc in target["procedures"]:
+        if proc["warp"] != "true":
+            continue
+        # Inner loops come first, so that what they move out can be moved
+        # further out of the loops around them
+        for node, key in reversed(statement_lists([proc])):
+            if not any(
+                    isinstance(stmt, dict) and stmt["type"] in LOOPS
+                    for stmt in node[key]):
+                continue
+            hoisted = []
+            for stmt in node[key]:
+                if isinstance(stmt, dict) and stmt["type"] in LOOPS:
+                    hoisted.extend(
+                        _hoist(stmt, proc["name"], effects, target, keys))
+                hoisted.append(stmt)
+            node[key] = hoisted
+    return target
@@ -1,77 +1,158 @@
 #!/usr/bin/env python3
 """This module compiles code to scratch projects."""
 
+import argparse
+import glob
 import os
-import json
-import shutil
-from hashlib import md5
-from lark import Lark
-
-from transformer import ScratchTransformer
-from indenter import ScratchIndenter
-from optimize import optimize
-from scratchify import scratchify
-
-
-def main():
-    """Compiles program.scratch to a scratch project."""
-    parser = Lark.open("grammar.lark",
-                       parser="lalr",
-                       transformer=ScratchTransformer,
-                       postlex=ScratchIndenter())
-
-    with open("program.scratch") as source_file:
-        source_code = source_file.read()
-    parsed = parser.parse(source_code)
-    # print(parsed)
-    parsed = optimize(parsed)
-    parsed = scratchify(parsed)
-
-    backdrop_md5 = md5sum("resources/backdrop.svg")
-
-    for i in parsed["targets"]:
-        i["costumes"] = [{
-            "assetId": backdrop_md5,
-            "name": "backdrop",
-            "md5ext": f"{backdrop_md5}.svg",
-            "dataFormat": "svg",
-            "rotationCenterX": 240,
-            "rotationCenterY": 180
-        }]
-
-    try:
-        with open("parsed.json", "w") as parsed_json_file:
-            json.dump(parsed, parsed_json_file, indent="\t")
-    except ValueError:
-        print(parsed)
-
-    create_project_files(parsed)
-
-
-def md5sum(file_name):
-    """Returns the md5 hash of a file."""
-    with open(file_name, "rb") as file:
-        return md5(file.read()).hexdigest()
-
-
-def create_project_files(project):
-    """Creates a scratch project file."""
-    try:
-        shutil.rmtree("project")
-    except FileNotFoundError:
-        pass
-    os.mkdir("project")
-
-    with open("project/project.json", "w") as project_json_file:
-        json.dump(project, project_json_file)
-
-    shutil.copy(
-        "resources/backdrop.svg",
-        f"project/{project['targets'][0]['costumes'][0]['assetId']}.svg")
-
-    os.system("zip --quiet -r project.sb3 project")
-    shutil.rmtree("project")
+import time
+
+from batch import compile_files, expand_sources, print_summary
+from cache import build_cache, procedure_cache
+from compiler import AssetDirectory, compile_source
+from evaluate import DEFAULT_BUDGET as DEFAULT_EVAL_BUDGET
+from inline import DEFAULT_BUDGET as DEFAULT_INLINE_BUDGET
+from passes import DEFAULT_LEVEL
+
+
+def parse_args(argv=None):
+    """Parses the command line arguments."""
+    arg_parser = argparse.ArgumentParser(
+        description="Compiles code into scratch projects.")
+    arg_parser.add_argument("sources",
+                            nargs="*",
+                            default=["program.scratch"],
+                            metavar="source",
+                            help="the file to compile. If several files or a "
+                            "glob pattern are given, each file is compiled to "
+                            "a .sb3 file next to it")
+    arg_parser.add_argument("-o",
+                            "--output",
+                            help="where to write the scratch project "
+                            "(project.sb3 by default), when "
+                            "compiling a single file")
+    arg_parser.add_argument("-j",
+                            "--jobs",
+                            type=int,
+                            default=1,
+                            help="the number of processes used to compile "
+                            "the targets, or the files when compiling several "
+                            "files")
+    arg_parser.add_argument("-O",
+                            dest="opt_level",
+                            type=int,
+                            choices=(0, 1, 2),
+                            default=DEFAULT_LEVEL,
+                            help="the optimization level: 0 disables the "
+                            "optimizer, 1 runs every pass once and 2 also "
+                            "runs the passes that add temporary variables and "
+                            "repeats the passes until nothing changes")
+    arg_parser.add_argument("--time-passes",
+                            action="store_true",
+                            help="print the time spent in each optimization "
+                            "pass")
+    arg_parser.add_argument("--inline-budget",
+                            type=int,
+                            default=DEFAULT_INLINE_BUDGET,
+                            metavar="NODES",
+                            help="the largest size of a procedure that is "
+                            "inlined at -O2, counted in AST nodes (%(default)s "
+                            "by default)")
+    arg_parser.add_argument("--eval-budget",
+                            type=int,
+                            default=DEFAULT_EVAL_BUDGET,
+                            metavar="STEPS",
+                            help="the largest number of statements run to "
+                            "evaluate a call with constant arguments at "
+                            "compile time (%(default)s by default)")
+    arg_parser.add_argument("--lower-recursion",
+                            action="store_true",
+                            help="at -O2, turn recursive procedures into "
+                            "loops that keep their parameters on lists")
+    arg_parser.add_argument("--entry-point",
+                            action="append",
+                            dest="entry_points",
+                            metavar="NAME",
+                            help="a procedure that is run by clicking it, as "
+                            "name or sprite.name. When given, procedures that "
+                            "can't be reached from an entry point are removed")
+    arg_parser.add_argument("--report-removed",
+                            action="store_true",
+                            help="print the procedures, variables and lists "
+                            "that were removed because they are never used")
+    arg_parser.add_argument("--incremental",
+                            action="store_true",
+                            help="reuse earlier builds of the same program "
+                            "and the blocks generated for procedures that "
+                            "haven't changed")
+    arg_parser.add_argument("--watch",
+                            action="store_true",
+                            help="compile again every time the source or "
+                            "the costumes change")
+    arg_parser.add_argument("--debug",
+                            action="store_true",
+                            help="also write the generated project to "
+                            "parsed.json")
+    args = arg_parser.parse_args(argv)
+
+    args.batch = len(args.sources) > 1 or any(
+        glob.has_magic(source) for source in args.sources)
+    args.sources = expand_sources(args.sources)
+    if args.batch and (args.output or args.watch or args.debug):
+        arg_parser.error(
+            "-o, --watch and --debug can only be used with a single file")
+    args.output = args.output or "project.sb3"
+    return args
+
+
+def main(argv=None):
+    """Compiles program.scratch, or the files given on the command line, to
+    scratch projects."""
+    args = parse_args(argv)
+
+    options = {
+        "opt_level": args.opt_level,
+        "time_passes": args.time_passes,
+        "entry_points": args.entry_points or [],
+        "report_removed": args.report_removed,
+        "inline_budget": args.inline_budget,
+        "lower_recursion": args.lower_recursion,
+        "eval_budget": args.eval_budget
+    }
+    if args.incremental:
+        options["procedure_cache"] = procedure_cache()
+        options["build_cache"] = build_cache()
+
+    failed = 0
+    if args.batch:
+        start = time.perf_counter()
+        results = compile_files(args.sources, args.jobs, options)
+        failed = print_summary(results, time.perf_counter() - start)
+    elif args.watch:
+        from watch import watch  # pylint: disable=import-outside-toplevel
+        try:
+            watch(args.sources[0], args.output, options)
+        except KeyboardInterrupt:
+            pass
+    else:
+        with open(args.sources[0]) as source_file:
+            source_code = source_file.read()
+
+        project = compile_source(
+            source_code,
+            AssetDirectory(os.path.dirname(os.path.abspath(args.sources[0]))),
+            debug_dir="." if args.debug else None,
+            jobs=args.jobs,
+            options=options)
+
+        with open(args.output, "wb") as project_file:
+            project_file.write(project)
+
+    if args.incremental:
+        options["procedure_cache"].prune()
+        options["build_cache"].prune()
+
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+"""This module contains the get_parser function, which loads the parser used for
+scratch source code. The LALR tables are cached on disk, keyed on the contents
+of the grammar and the indenter, so they are only rebuilt when either changes."""
+import inspect
+import os
+import threading
+
+from cache import cache_dir, content_hash
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "grammar.lark")
+
+_parser = None
+_parser_lock = threading.Lock()
+_parse_lock = threading.Lock()
+
+
+def grammar_hash() -> str:
+    """Returns a hash of everything that the parser tables depend on."""
+    from indenter import ScratchIndenter  # pylint: disable=import-outside-toplevel
+    with open(GRAMMAR_FILE) as grammar_file:
+        grammar = grammar_file.read()
+    return content_hash(grammar, inspect.getsource(ScratchIndenter))
+
+
+def _build_parser():
+    # Lark and the transformer are only imported once a parser is needed
+    # pylint: disable=import-outside-toplevel
+    from lark import Lark
+    from transformer import ScratchTransformer
+    from indenter import ScratchIndenter
+
+    try:
+        cache = os.path.join(cache_dir("parser"), f"{grammar_hash()}.lark")
+    except OSError:
+        cache = False
+
+    with open(GRAMMAR_FILE) as grammar_file:
+        return Lark(grammar_file,
+                    parser="lalr",
+                    transformer=ScratchTransformer,
+                    postlex=ScratchIndenter(),
+                    cache=cache)
+
+
+def get_parser():
+    """Returns the parser, building or loading it on the first call."""
+    global _parser  # pylint: disable=global-statement
+    with _parser_lock:
+        if _parser is None:
+            _parser = _build_parser()
+        return _parser
+
+
+def parse(source_code: str) -> dict:
+    """Parses source code into an AST. The indenter keeps its state in the
+    parser while parsing, so only one thread can parse at a time."""
+    parser = get_parser()
+    with _parse_lock:
+        return parser.parse(source_code)
@@ -0,0 +1,169 @@
+"""This module contains the pass manager, which runs the optimization passes on
+an AST. Program passes see the whole program and run before the targets are
+split up, target passes run on one stage or sprite at a time.
+
+Each pass is a function that takes an AST and the compiler options and returns
+the optimized AST. A pass is only run if the optimization level is at least
+the level it is registered with. At level 1 every pass runs once, at level 2
+the passes are repeated until none of them changes the AST."""
+import sys
+import time
+
+from cache import tree_hash
+from constants import initialize_lists, propagate_constants
+from cse import eliminate_common_subexpressions
+from dead_code import eliminate_dead_code
+from evaluate import DEFAULT_BUDGET as DEFAULT_EVAL_BUDGET, evaluate_calls
+from inline import DEFAULT_BUDGET as DEFAULT_INLINE_BUDGET, inline_procedures
+from licm import hoist_loop_invariants
+from optimize import optimize
+from recursion import lower_recursion
+from tail_calls import eliminate_tail_calls
+from unused import remove_unused, remove_unused_temporaries
+from warp import infer_warp
+
+
+def _evaluate_calls(tree, options):
+    return evaluate_calls(tree,
+                          options.get("eval_budget", DEFAULT_EVAL_BUDGET))
+
+
+def _infer_warp(tree, _):
+    return infer_warp(tree)
+
+
+def _inline_procedures(tree, options):
+    return inline_procedures(
+        tree, options.get("inline_budget", DEFAULT_INLINE_BUDGET))
+
+
+def _eliminate_tail_calls(tree, _):
+    return eliminate_tail_calls(tree)
+
+
+def _lower_recursion(tree, options):
+    # This pass is opt-in, since it adds lists to the project
+    if not options.get("lower_recursion", False):
+        return tree
+    return lower_recursion(tree)
+
+
+def _fold_constants(tree, _):
+    return optimize(tree)
+
+
+def _eliminate_dead_code(tree, _):
+    return eliminate_dead_code(tree)
+
+
+def _hoist_loop_invariants(tree, _):
+    return hoist_loop_invariants(tree)
+
+
+def _eliminate_common_subexpressions(tree, _):
+    return eliminate_common_subexpressions(tree)
+
+
+def _remove_unused_temporaries(tree, _):
+    return remove_unused_temporaries(tree)
+
+
+PROGRAM_PASSES = [
+    ("propagate_constants", propagate_constants, 1),
+    ("initialize_lists", initialize_lists, 1),
+    ("remove_unused", remove_unused, 1),
+]
+
+TARGET_PASSES = [
+    ("evaluate_calls", _evaluate_calls, 1),
+    ("infer_warp", _infer_warp, 2),
+    ("inline_procedures", _inline_procedures, 2),
+    ("eliminate_tail_calls", _eliminate_tail_calls, 2),
+    ("lower_recursion", _lower_recursion, 2),
+    ("fold_constants", _fold_constants, 1),
+    ("eliminate_dead_code", _eliminate_dead_code, 1),
+    ("hoist_loop_invariants", _hoist_loop_invariants, 2),
+    ("eliminate_common_subexpressions", _eliminate_common_subexpressions, 2),
+    ("remove_unused_temporaries", _remove_unused_temporaries, 2),
+]
+
+DEFAULT_LEVEL = 1
+MAX_ITERATIONS = 10
+
+
+def register_pass(name: str, func, level: int, program=False):
+    """Adds a pass after the ones that are already registered."""
+    (PROGRAM_PASSES if program else TARGET_PASSES).append((name, func, level))
+
+
+def count_nodes(tree) -> int:
+    """Returns the number of dicts in an AST."""
+    count = 0
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            count += 1
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return count
+
+
+def _print_report(label: str, stats: dict):
+    width = max(len(name) for name in stats)
+    print(f"Passes for {label}:", file=sys.stderr)
+    print(f"  {'pass':<{width}} {'runs':>4} {'time':>10} {'nodes':>7}",
+          file=sys.stderr)
+    for name, (runs, seconds, change) in stats.items():
+        print(
+            f"  {name:<{width}} {runs:>4} {seconds * 1000:>8.2f}ms "
+            f"{change:>+7}",
+            file=sys.stderr)
+
+
+def run_passes(tree, passes: list, options: dict, label: str):
+    """Runs the passes that are enabled by the optimization level in options
+    and returns the optimized AST. If options["time_passes"] is set, the time
+    spent in each pass and how much it changed the number of nodes over all
+    of its runs is printed."""
+    level = options.get("opt_level", DEFAULT_LEVEL)
+    time_passes = options.get("time_passes", False)
+    enabled = [(name, func) for name, func, min_level in passes
+               if level >= min_level]
+    stats = {name: [0, 0.0, 0] for name, _ in enabled}
+
+    for _ in range(MAX_ITERATIONS if level >= 2 else 1):
+        changed = False
+        for name, func in enabled:
+            if level >= 2:
+                before = tree_hash(tree)
+            if time_passes:
+                nodes = count_nodes(tree)
+                start = time.perf_counter()
+
+            tree = func(tree, options)
+
+            if time_passes:
+                stats[name][0] += 1
+                stats[name][1] += time.perf_counter() - start
+                stats[name][2] += count_nodes(tree) - nodes
+            if level >= 2:
+                changed = changed or tree_hash(tree) != before
+        if not changed:
+            break
+
+    if time_passes and enabled:
+        _print_report(label, stats)
+    return tree
+
+
+def optimize_program(tree: dict, options: dict) -> dict:
+    """Runs the program passes on a parsed program."""
+    return run_passes(tree, PROGRAM_PASSES, options, "program")
+
+
+def optimize_target(target: dict, options: dict) -> dict:
+    """Runs the target passes on a stage or sprite."""
+    return run_passes(target, TARGET_PASSES, options,
+                      target.get("name", "Stage"))
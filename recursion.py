@@ -0,0 +1,195 @@
+"""This module contains the lower_recursion function, which turns recursive
+procedures into loops that keep their parameters on lists."""
+from cse import expression_children
+from effects import procedure_effects, reads
+from licm import LOOPS
+from tree import add_temporary, walk
+
+
+def _is_self_call(stmt: dict, proc: dict) -> bool:
+    return stmt["type"] == "procedures_call" and stmt["name"] == proc["name"]
+
+
+def _contains_self_call(stmt: dict, proc: dict) -> bool:
+    return any(_is_self_call(node, proc) for node in walk(stmt))
+
+
+def _set(name: str, value) -> dict:
+    return {"type": "data_setvariableto", "name": name, "value": value}
+
+
+def _list_call(name: str, method: str, *args) -> dict:
+    return {
+        "type": "member_proc_call",
+        "caller": name,
+        "name": method,
+        "args": list(args)
+    }
+
+
+def _top(name: str) -> dict:
+    return {"type": "data_itemoflist", "name": name, "INDEX": "last"}
+
+
+class _Lowering:
+    """Splits the body of a procedure into blocks that end where the
+    procedure calls itself. The blocks are run by a loop, where the variable
+    pc holds the number of the next block to run."""
+    def __init__(self, proc: dict, target: dict):
+        self.proc = proc
+        self.target = target
+        self.frames = [
+            add_temporary(target, "rec", "lists") for _ in proc["params"]
+        ]
+        self.returns = add_temporary(target, "rec", "lists")
+        self.pc = add_temporary(target, "rec")
+        self.blocks = []
+
+    def new_block(self) -> int:
+        self.blocks.append([])
+        return len(self.blocks) - 1
+
+    def call(self, stmt: dict, after: int) -> list:
+        """Returns the statements that push a new frame and start the body
+        again. Arguments that read a parameter whose list already got the new
+        value are computed into temporaries first."""
+        temporaries = []
+        pushes = []
+        pushed = set()
+        for frame, arg in zip(self.frames, stmt["args"]):
+            if isinstance(arg, dict) and reads(arg) & pushed:
+                name = add_temporary(self.target, "rec")
+                temporaries.append(_set(name, arg))
+                arg = {"type": "ident", "name": name}
+            pushes.append(_list_call(frame, "append", arg))
+            pushed.add(frame)
+        return [
+            *temporaries, *pushes,
+            _list_call(self.returns, "append", after),
+            _set(self.pc, 0)
+        ]
+
+    def ret(self) -> list:
+        return [
+            *(_list_call(frame, "delete", "last") for frame in self.frames),
+            _set(self.pc, _top(self.returns)),
+            _list_call(self.returns, "delete", "last")
+        ]
+
+    def emit(self, stmts: list, current: int, after):
+        """Adds the statements to the block numbered current and the blocks
+        after it. After them, the block numbered after runs, or the procedure
+        returns if after is None."""
+        for stmt in stmts:
+            if not _contains_self_call(stmt, self.proc):
+                self.blocks[current].append(stmt)
+            elif _is_self_call(stmt, self.proc):
+                following = self.new_block()
+                self.blocks[current].extend(self.call(stmt, following))
+                current = following
+            else:
+                join = self.new_block()
+                true_block = self.new_block()
+                self.emit(stmt["true_branch"], true_block, join)
+                false_block = join
+                if stmt["type"] == "control_if_else":
+                    false_block = self.new_block()
+                    self.emit(stmt["false_branch"], false_block, join)
+                self.blocks[current].append({
+                    "type": "control_if_else",
+                    "CONDITION": stmt["CONDITION"],
+                    "true_branch": [_set(self.pc, true_block)],
+                    "false_branch": [_set(self.pc, false_block)]
+                })
+                current = join
+        self.blocks[current].extend(
+            self.ret() if after is None else [_set(self.pc, after)])
+
+    def dispatch(self, low: int, high: int) -> list:
+        """Returns the statements that run the block numbered pc, for blocks
+        low to high - 1, by comparing pc in a balanced tree of ifs."""
+        if high - low == 1:
+            return self.blocks[low]
+        middle = (low + high) // 2
+        return [{
+            "type": "control_if_else",
+            "CONDITION": {
+                "type": "operator_lt",
+                "OPERAND1": {
+                    "type": "ident",
+                    "name": self.pc
+                },
+                "OPERAND2": middle
+            },
+            "true_branch": self.dispatch(low, middle),
+            "false_branch": self.dispatch(middle, high)
+        }]
+
+    def lower(self):
+        names = {
+            param["name"]: frame
+            for param, frame in zip(self.proc["params"], self.frames)
+        }
+        for node in walk(self.proc["body"]):
+            for container, key in expression_children(node):
+                child = container[key]
+                if child["type"] == "ident" and child["name"] in names:
+                    container[key] = _top(names[child["name"]])
+
+        self.emit(self.proc["body"], self.new_block(), None)
+        # The lists are cleared first, in case the procedure was stopped
+        # while it ran the last time
+        self.proc["body"] = [
+            *(_list_call(name, "clear")
+              for name in (*self.frames, self.returns)),
+            *(_list_call(frame, "append", {
+                "type": "ident",
+                "name": param["name"]
+            }) for param, frame in zip(self.proc["params"], self.frames)),
+            _list_call(self.returns, "append", -1),
+            _set(self.pc, 0),
+            {
+                "type": "control_repeat_until",
+                "CONDITION": {
+                    "type": "operator_equals",
+                    "OPERAND1": {
+                        "type": "ident",
+                        "name": self.pc
+                    },
+                    "OPERAND2": -1
+                },
+                "body": self.dispatch(0, len(self.blocks))
+            },
+        ]
+
+
+def _can_lower(proc: dict, effects: dict) -> bool:
+    proc_effects = effects[proc["name"]]
+    if proc["warp"] != "true" or proc_effects["waits"] \
+            or proc["name"] not in proc_effects["calls"]:
+        return False
+    # Other procedures that call this one would change the lists
+    if any(proc["name"] in effects[callee]["calls"]
+           for callee in proc_effects["calls"] - {proc["name"]}):
+        return False
+    for node in walk(proc["body"]):
+        if node["type"] in LOOPS and _contains_self_call(node, proc):
+            return False
+        if _is_self_call(node, proc) \
+                and len(node["args"]) != len(proc["params"]):
+            return False
+    return True
+
+
+def lower_recursion(target: dict) -> dict:
+    """Turns the procedures of a target that call themselves into a loop that
+    keeps the parameters of each call on lists of the target, so that a call
+    only pushes the arguments instead of running a procedures_call block.
+    Like the other passes that use temporaries, only warp procedures that
+    can't wait and aren't called by their own callees are changed, and calls
+    inside loops aren't supported."""
+    effects = procedure_effects(target["procedures"])
+    for proc in target["procedures"]:
+        if _can_lower(proc, effects):
+            _Lowering(proc, target).lower()
+    return target
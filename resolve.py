@@ -1,63 +1,103 @@
 """This module contains functions for finding variables, lists, procedures, etc
 by their names."""
-import itertools
+
+
+def _scoped(*scopes) -> dict:
+    """Merges the scopes into one dict. Names in later scopes shadow names in
+    earlier ones."""
+    merged = {}
+    for scope in scopes:
+        merged.update(scope)
+    return merged
+
+
+def build_symbols(stage: dict, sprite: dict) -> dict:
+    """Builds the symbol table of a target, where the names declared in the
+    sprite shadow the names declared in the stage."""
+    def by_name(kind, items, key=lambda item: item["id"]):
+        # The first declaration of a name wins, like in a linear search
+        return {item["name"]: (kind, key(item)) for item in reversed(items)}
+
+    stage_vars = by_name("var", stage["variables"])
+    stage_lists = by_name("list", stage["lists"])
+    sprite_vars = by_name("var", sprite["variables"])
+    sprite_lists = by_name("list", sprite["lists"])
+    sprite_procs = by_name("proc", sprite["procedures"], lambda proc: proc)
+
+    return {
+        "var": _scoped(stage_vars, sprite_vars),
+        "list": _scoped(stage_lists, sprite_lists),
+        "var_or_list": _scoped(stage_lists, stage_vars, sprite_lists,
+                               sprite_vars),
+        "proc": sprite_procs,
+        "ident": _scoped({"stage": ("stage", stage)}, stage_lists, stage_vars,
+                         sprite_procs, sprite_lists, sprite_vars),
+    }
+
+
+def _symbols(env) -> dict:
+    if "symbols" not in env:
+        env["symbols"] = build_symbols(env["stage"], env["sprite"])
+    return env["symbols"]
+
+
+def summarize_symbol(symbol):
+    """Returns the parts of a symbol that generated code depends on."""
+    if symbol is None:
+        return None
+    kind, value = symbol
+    if kind == "proc":
+        return [kind, value["warp"], [param["name"] for param in value["params"]]]
+    if kind == "stage":
+        return [kind]
+    return [kind, value]
+
+
+def _lookup(table: str, name: str, env):
+    """Looks up a name in the symbol table of env. If env has a "resolved"
+    dict, the lookup is recorded in it."""
+    symbol = _symbols(env)[table].get(name)
+    if "resolved" in env:
+        env["resolved"][table, name] = summarize_symbol(symbol)
+    return symbol
 
 
 def resolve_var(name: str, env) -> str:
     """Finds the variable with specified name in env."""
-    for var in itertools.chain(env["sprite"]["variables"],
-                               env["stage"]["variables"]):
-        if var["name"] == name:
-            return var["id"]
-    raise NameError(f"Variable '{name}' does not exist")
+    symbol = _lookup("var", name, env)
+    if symbol is None:
+        raise NameError(f"Variable '{name}' does not exist")
+    return symbol[1]
 
 
 def resolve_list(name: str, env) -> str:
     """Finds the list with specified name in env."""
-    for lst in itertools.chain(env["sprite"]["lists"], env["stage"]["lists"]):
-        if lst["name"] == name:
-            return lst["id"]
-    raise NameError(f"List '{name}' does not exist")
+    symbol = _lookup("list", name, env)
+    if symbol is None:
+        raise NameError(f"List '{name}' does not exist")
+    return symbol[1]
 
 
 def resolve_var_or_list(name: str, env):
     """Finds the variable or list with specified name in env."""
-    for owner in env["sprite"], env["stage"]:
-        for var in owner["variables"]:
-            if var["name"] == name:
-                return "var", var["id"]
-        for lst in owner["lists"]:
-            if lst["name"] == name:
-                return "list", lst["id"]
-    raise NameError(f"Variable or list '{name}' does not exist")
+    symbol = _lookup("var_or_list", name, env)
+    if symbol is None:
+        raise NameError(f"Variable or list '{name}' does not exist")
+    return symbol
 
 
 def resolve_proc(name: str, env) -> str:
     """Finds the procedure with specified name in env."""
-    for proc in env["sprite"]["procedures"]:
-        if proc["name"] == name:
-            return proc
-    raise NameError(f"Procedure '{name}' does not exist")
+    symbol = _lookup("proc", name, env)
+    if symbol is None:
+        raise NameError(f"Procedure '{name}' does not exist")
+    return symbol[1]
 
 
 def resolve_ident(name: str, env) -> str:
     """Finds the variable, list, procedure or sprite with specified name in
     env."""
-    for var in env["sprite"]["variables"]:
-        if var["name"] == name:
-            return "var", var["id"]
-    for lst in env["sprite"]["lists"]:
-        if lst["name"] == name:
-            return "list", lst["id"]
-    for proc in env["sprite"]["procedures"]:
-        if proc["name"] == name:
-            return "proc", proc
-    for var in env["stage"]["variables"]:
-        if var["name"] == name:
-            return "var", var["id"]
-    for lst in env["stage"]["lists"]:
-        if lst["name"] == name:
-            return "list", lst["id"]
-    if name == "stage":
-        return "stage", env["stage"]
-    raise NameError(f"Name '{name}' is not defined")
+    symbol = _lookup("ident", name, env)
+    if symbol is None:
+        raise NameError(f"Name '{name}' is not defined")
+    return symbol
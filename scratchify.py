@@ -1,10 +1,14 @@
 """This module contains the scratchify function, which converts an AST into a
 valid object for the project.json file in a scratch project."""
-import itertools
-from resolve import resolve_var, resolve_list, resolve_proc, \
-resolve_var_or_list, resolve_ident
+import pickle
+import sys
+from functools import lru_cache
+from types import GeneratorType
 
-id_maker = (f"_{i}" for i in itertools.count())
+from cache import content_hash, tree_hash
+from context import CompileContext
+from resolve import resolve_var, resolve_list, resolve_proc, \
+resolve_var_or_list, resolve_ident, summarize_symbol
 
 
 def _assign_parent(parent_id: str, *args):
@@ -36,12 +40,114 @@ def _block_noargs(opcode):
     return generated_func
 
 
+def _block_inputs(opcode, *inputs, fields=()):
+    def generated_func(node: dict, env):
+        values = yield [node[name] for name in inputs]
+        _assign_parent(node["id"], *values)
+        return [(node["id"], {
+            "opcode": opcode,
+            "next": None,
+            "parent": None,
+            "inputs": {
+                name: _number_input(value)
+                for name, value in zip(inputs, values)
+            },
+            "fields": {name: [node[name], None]
+                       for name in fields},
+            "shadow": False,
+            "topLevel": False
+        })]
+
+    return generated_func
+
+
+def _substack_input(name: str, substack: list) -> dict:
+    # Empty substacks are left out of the inputs
+    return {name: [2, substack[0][0][0]]} if substack else {}
+
+
 def _number_input(nodes) -> list:
     if nodes[0][0][0] in (12, 13):
         return [3, nodes[0][0], [4, 0]]
     return [1, nodes[0][0]]
 
 
+@lru_cache(maxsize=None)
+def _codegen_version() -> str:
+    sources = []
+    for module in (__name__, "resolve", "context"):
+        with open(sys.modules[module].__file__, "rb") as source_file:
+            sources.append(source_file.read())
+    return content_hash(*sources)
+
+
+def _procedure_key(node: dict, env) -> str:
+    """Returns a hash of the AST of a procedure and its ID namespace. The
+    symbols that the procedure refers to are checked separately when a cached
+    entry is found."""
+    return content_hash(_codegen_version(), env["context"].prefix,
+                        tree_hash(node))
+
+
+def _procedure_blocks(node: dict, env) -> dict:
+    """Scratchifies a procedure, reusing the blocks from the procedure cache if
+    it is enabled, the procedure hasn't changed and every name used in it
+    still resolves to the same thing."""
+    cache = env["context"].options.get("procedure_cache")
+    if cache is None:
+        scratchify(node, env)
+        return env["blocks"]
+
+    key = _procedure_key(node, env)
+    cached = cache.get(key)
+    if cached is not None:
+        cached = pickle.loads(cached)
+        symbols = env["symbols"]
+        if all(
+                summarize_symbol(symbols[table].get(name)) == summary
+                for (table, name), summary in cached["resolved"].items()):
+            return cached["blocks"]
+
+    env["resolved"] = {}
+    scratchify(node, env)
+    cache.put(
+        key,
+        pickle.dumps(
+            {
+                "resolved": env["resolved"],
+                "blocks": env["blocks"]
+            }, pickle.HIGHEST_PROTOCOL))
+    return env["blocks"]
+
+
+def _target_blocks(node: dict, env) -> dict:
+    """Scratchifies the procedures of a target. Every block is stored in
+    env["blocks"] as it is generated, so the work done is linear in the number
+    of blocks. Each procedure gets its own ID namespace, so that changing one
+    procedure doesn't change the IDs in the others."""
+    env["blocks"] = {}
+    contexts = {}
+    for proc in node["procedures"]:
+        if proc["name"] in contexts:
+            raise NameError(
+                f"Procedure '{proc['name']}' is defined multiple times")
+        context = env["context"].child(
+            f"{env['context'].prefix}.{proc['name']}")
+        # The prototypes and their inputs get their IDs before any procedure
+        # is scratchified, so that calls can refer to procedures that come
+        # later, or to the procedure they are in
+        proc["prototype_id"] = context.new_id()
+        proc["argument_ids"] = [context.new_id() for _ in proc["params"]]
+        contexts[proc["name"]] = context
+    for proc in node["procedures"]:
+        env["blocks"].update(
+            _procedure_blocks(proc, {
+                **env, "context": contexts[proc["name"]],
+                "blocks": {}
+            }))
+    return env["blocks"]
+
+
 def _stage_def(node: dict, env):
     return {
         "isStage":
@@ -49,15 +155,13 @@ def _stage_def(node: dict, env):
         "name":
         "Stage",
         "variables":
-        {var["id"]: [var["name"], 0]
+        {var["id"]: [var["name"], var.get("value", 0)]
          for var in node["variables"]},
-        "lists": {lst["id"]: [lst["name"], []]
+        "lists": {lst["id"]: [lst["name"], list(lst.get("value", []))]
                   for lst in node["lists"]},
         "broadcasts": {},
         "blocks":
-        dict(i
-             for i in sum((scratchify(i, env) for i in node["procedures"]), [])
-             if isinstance(i, tuple)),
+        _target_blocks(node, env),
         "comments": {},
         "currentCostume":
         0,
@@ -83,15 +187,13 @@ def _sprite_def(node: dict, env):
         "name":
         node["name"],
         "variables":
-        {var["id"]: [var["name"], 0]
+        {var["id"]: [var["name"], var.get("value", 0)]
          for var in node["variables"]},
-        "lists": {lst["id"]: [lst["name"], []]
+        "lists": {lst["id"]: [lst["name"], list(lst.get("value", []))]
                   for lst in node["lists"]},
         "broadcasts": {},
         "blocks":
-        dict(block for block in sum((scratchify(proc, env)
-                                     for proc in node["procedures"]), [])
-             if isinstance(block, tuple)),
+        _target_blocks(node, env),
         "comments": {},
         "currentCostume":
         0,
@@ -119,16 +221,22 @@ def _sprite_def(node: dict, env):
 
 
 def _procedures_definition(node: dict, env) -> list:
-    params = [scratchify(i, env)[0] for i in node["params"]]
+    prototype_id = node["prototype_id"]
+    argument_ids = node["argument_ids"]
+
+    params = yield node["params"]
+    params = [i[0] for i in params]
 
-    body = [scratchify(i, env) for i in node["body"]]
+    # Parameters shadow the variables and lists with the same names
+    env["params"] = {param["name"] for param in node["params"]}
+    body = yield node["body"]
 
     definition = (node["id"], {
         "opcode": "procedures_definition",
         "next": body[0][0][0] if len(body) > 0 else None,
         "parent": None,
         "inputs": {
-            "custom_block": [1, next(id_maker)]
+            "custom_block": [1, prototype_id]
         },
         "fields": {},
         "shadow": False,
@@ -137,9 +245,12 @@ def _procedures_definition(node: dict, env) -> list:
         "y": 0
     })
 
-    prototype_inputs = {next(id_maker): [1, i[0]] for i in params}
+    prototype_inputs = {
+        argument_id: [1, i[0]]
+        for argument_id, i in zip(argument_ids, params)
+    }
 
-    prototype = (definition[1]["inputs"]["custom_block"][1], {
+    prototype = (prototype_id, {
         "opcode": "procedures_prototype",
         "next": None,
         "parent": definition[0],
@@ -169,9 +280,7 @@ def _procedures_definition(node: dict, env) -> list:
 
     _doubly_link_stmts(definition, body)
 
-    node["prototype"] = prototype
-
-    return sum(body, [*params, definition, prototype])
+    return [definition, prototype]
 
 
 def _param(node: dict, _) -> list:
@@ -189,7 +298,7 @@ def _param(node: dict, _) -> list:
 
 
 def _motion_movesteps(node: dict, env) -> list:
-    steps = scratchify(node["STEPS"], env)
+    steps = yield node["STEPS"]
     _assign_parent(node["id"], steps)
     return [(node["id"], {
         "opcode": "motion_movesteps",
@@ -201,12 +310,12 @@ def _motion_movesteps(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + steps
+    })]
 
 
 def _motion_gotoxy(node: dict, env) -> list:
-    x_coord = scratchify(node["X"], env)
-    y_coord = scratchify(node["Y"], env)
+    x_coord = yield node["X"]
+    y_coord = yield node["Y"]
     _assign_parent(node["id"], x_coord, y_coord)
     return [(node["id"], {
         "opcode": "motion_gotoxy",
@@ -219,11 +328,11 @@ def _motion_gotoxy(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + x_coord + y_coord
+    })]
 
 
 def _motion_turnright(node: dict, env) -> dict:
-    degrees = scratchify(node["DEGREES"], env)
+    degrees = yield node["DEGREES"]
     _assign_parent(node["id"], degrees)
     return [(node["id"], {
         "opcode": "motion_turnright",
@@ -235,11 +344,11 @@ def _motion_turnright(node: dict, env) -> dict:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + degrees
+    })]
 
 
 def _motion_turnleft(node: dict, env) -> dict:
-    degrees = scratchify(node["DEGREES"], env)
+    degrees = yield node["DEGREES"]
     _assign_parent(node["id"], degrees)
     return [(node["id"], {
         "opcode": "motion_turnleft",
@@ -251,11 +360,11 @@ def _motion_turnleft(node: dict, env) -> dict:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + degrees
+    })]
 
 
 def _motion_pointindirection(node: dict, env) -> list:
-    direction = scratchify(node["DIRECTION"], env)
+    direction = yield node["DIRECTION"]
     _assign_parent(node["id"], direction)
     return [(node["id"], {
         "opcode": "motion_pointindirection",
@@ -267,13 +376,13 @@ def _motion_pointindirection(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + direction
+    })]
 
 
 def _motion_glidesecstoxy(node: dict, env) -> list:
-    x_coord = scratchify(node["X"], env)
-    y_coord = scratchify(node["Y"], env)
-    secs = scratchify(node["SECS"], env)
+    x_coord = yield node["X"]
+    y_coord = yield node["Y"]
+    secs = yield node["SECS"]
     _assign_parent(node["id"], x_coord, y_coord, secs)
     return [(node["id"], {
         "opcode": "motion_glidesecstoxy",
@@ -287,14 +396,14 @@ def _motion_glidesecstoxy(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + x_coord + y_coord + secs
+    })]
 
 
 def _control_if(node: dict, env) -> list:
-    condition = scratchify(node["CONDITION"], env)
+    condition = yield node["CONDITION"]
     _assign_parent(node["id"], condition)
 
-    substack = [scratchify(i, env) for i in node["true_branch"]]
+    substack = yield node["true_branch"]
 
     if_stmt = (node["id"], {
         "opcode": "control_if",
@@ -302,7 +411,7 @@ def _control_if(node: dict, env) -> list:
         "parent": None,
         "inputs": {
             "CONDITION": [2, condition[0][0]],
-            "SUBSTACK": [2, substack[0][0][0]]
+            **_substack_input("SUBSTACK", substack)
         },
         "fields": {},
         "shadow": False,
@@ -311,15 +420,15 @@ def _control_if(node: dict, env) -> list:
 
     _doubly_link_stmts(if_stmt, substack)
 
-    return sum(substack, [if_stmt] + condition)
+    return [if_stmt]
 
 
 def _control_if_else(node: dict, env) -> list:
-    condition = scratchify(node["CONDITION"], env)
+    condition = yield node["CONDITION"]
     _assign_parent(node["id"], condition)
 
-    substack = [scratchify(i, env) for i in node["true_branch"]]
-    substack2 = [scratchify(i, env) for i in node["false_branch"]]
+    substack = yield node["true_branch"]
+    substack2 = yield node["false_branch"]
 
     if_stmt = (node["id"], {
         "opcode": "control_if_else",
@@ -327,8 +436,8 @@ def _control_if_else(node: dict, env) -> list:
         "parent": None,
         "inputs": {
             "CONDITION": [2, condition[0][0]],
-            "SUBSTACK": [2, substack[0][0][0]],
-            "SUBSTACK2": [2, substack2[0][0][0]]
+            **_substack_input("SUBSTACK", substack),
+            **_substack_input("SUBSTACK2", substack2)
         },
         "fields": {},
         "shadow": False,
@@ -338,14 +447,14 @@ def _control_if_else(node: dict, env) -> list:
     _doubly_link_stmts(if_stmt, substack)
     _doubly_link_stmts(if_stmt, substack2)
 
-    return sum(substack + substack2, [if_stmt, *condition])
+    return [if_stmt]
 
 
 def _control_repeat(node: dict, env) -> list:
-    times = scratchify(node["TIMES"], env)
+    times = yield node["TIMES"]
     _assign_parent(node["id"], times)
 
-    substack = [scratchify(i, env) for i in node["body"]]
+    substack = yield node["body"]
 
     loop = (node["id"], {
         "opcode": "control_repeat",
@@ -353,7 +462,7 @@ def _control_repeat(node: dict, env) -> list:
         "parent": None,
         "inputs": {
             "TIMES": _number_input(times),
-            "SUBSTACK": [2, substack[0][0][0]]
+            **_substack_input("SUBSTACK", substack)
         },
         "fields": {},
         "shadow": False,
@@ -362,18 +471,18 @@ def _control_repeat(node: dict, env) -> list:
 
     _doubly_link_stmts(loop, substack)
 
-    return sum(substack, [loop, *times])
+    return [loop]
 
 
 def _control_forever(node: dict, env) -> list:
-    substack = [scratchify(i, env) for i in node["body"]]
+    substack = yield node["body"]
 
     loop = (node["id"], {
         "opcode": "control_forever",
         "next": None,
         "parent": None,
         "inputs": {
-            "SUBSTACK": [2, substack[0][0][0]]
+            **_substack_input("SUBSTACK", substack)
         },
         "fields": {},
         "shadow": False,
@@ -382,14 +491,14 @@ def _control_forever(node: dict, env) -> list:
 
     _doubly_link_stmts(loop, substack)
 
-    return sum(substack, [loop])
+    return [loop]
 
 
 def _control_while(node: dict, env) -> list:
-    condition = scratchify(node["CONDITION"], env)
+    condition = yield node["CONDITION"]
     _assign_parent(node["id"], condition)
 
-    substack = [scratchify(i, env) for i in node["body"]]
+    substack = yield node["body"]
 
     loop = (node["id"], {
         "opcode": "control_while",
@@ -397,7 +506,7 @@ def _control_while(node: dict, env) -> list:
         "parent": None,
         "inputs": {
             "CONDITION": [2, condition[0][0]],
-            "SUBSTACK": [2, substack[0][0][0]]
+            **_substack_input("SUBSTACK", substack)
         },
         "fields": {},
         "shadow": False,
@@ -406,14 +515,14 @@ def _control_while(node: dict, env) -> list:
 
     _doubly_link_stmts(loop, substack)
 
-    return sum(substack, [loop, *condition])
+    return [loop]
 
 
 def _control_repeat_until(node: dict, env) -> list:
-    condition = scratchify(node["CONDITION"], env)
+    condition = yield node["CONDITION"]
     _assign_parent(node["id"], condition)
 
-    substack = [scratchify(i, env) for i in node["body"]]
+    substack = yield node["body"]
 
     loop = (node["id"], {
         "opcode": "control_repeat_until",
@@ -421,7 +530,7 @@ def _control_repeat_until(node: dict, env) -> list:
         "parent": None,
         "inputs": {
             "CONDITION": [2, condition[0][0]],
-            "SUBSTACK": [2, substack[0][0][0]]
+            **_substack_input("SUBSTACK", substack)
         },
         "fields": {},
         "shadow": False,
@@ -430,13 +539,13 @@ def _control_repeat_until(node: dict, env) -> list:
 
     _doubly_link_stmts(loop, substack)
 
-    return sum(substack, [loop, *condition])
+    return [loop]
 
 
 def _bin_numeric_op(opcode: str):
     def generated_func(node: dict, env):
-        num1 = scratchify(node["NUM1"], env)
-        num2 = scratchify(node["NUM2"], env)
+        num1 = yield node["NUM1"]
+        num2 = yield node["NUM2"]
         _assign_parent(node["id"], num1, num2)
         return [(node["id"], {
             "opcode": opcode,
@@ -449,15 +558,15 @@ def _bin_numeric_op(opcode: str):
             "fields": {},
             "shadow": False,
             "topLevel": False
-        })] + num1 + num2
+        })]
 
     return generated_func
 
 
 def _binary_logic_operator(opcode: str):
     def generated_func(node: dict, env):
-        operand1 = scratchify(node["OPERAND1"], env)
-        operand2 = scratchify(node["OPERAND2"], env)
+        operand1 = yield node["OPERAND1"]
+        operand2 = yield node["OPERAND2"]
         _assign_parent(node["id"], operand1, operand2)
         return [(node["id"], {
             "opcode": opcode,
@@ -470,13 +579,13 @@ def _binary_logic_operator(opcode: str):
             "fields": {},
             "shadow": False,
             "topLevel": False
-        })] + operand1 + operand2
+        })]
 
     return generated_func
 
 
 def _operator_not(node: dict, env) -> list:
-    operand = scratchify(node["OPERAND"], env)
+    operand = yield node["OPERAND"]
     _assign_parent(node["id"], operand)
     return [(node["id"], {
         "opcode": "operator_not",
@@ -488,12 +597,12 @@ def _operator_not(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + operand
+    })]
 
 
 def _operator_random(node: dict, env) -> list:
-    low = scratchify(node["FROM"], env)
-    high = scratchify(node["TO"], env)
+    low = yield node["FROM"]
+    high = yield node["TO"]
     _assign_parent(node["id"], low, high)
     return [(node["id"], {
         "opcode": "operator_random",
@@ -506,12 +615,12 @@ def _operator_random(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + low + high
+    })]
 
 
 def _operator_join(node: dict, env) -> list:
-    string1 = scratchify(node["STRING1"], env)
-    string2 = scratchify(node["STRING2"], env)
+    string1 = yield node["STRING1"]
+    string2 = yield node["STRING2"]
     _assign_parent(node["id"], string1, string2)
     return [(node["id"], {
         "opcode": "operator_join",
@@ -524,12 +633,12 @@ def _operator_join(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + string1 + string2
+    })]
 
 
 def _data_setvariableto(node: dict, env) -> list:
     var_id = resolve_var(node["name"], env)
-    value = scratchify(node["value"], env)
+    value = yield node["value"]
     _assign_parent(node["id"], value)
     return [(node["id"], {
         "opcode": "data_setvariableto",
@@ -543,12 +652,12 @@ def _data_setvariableto(node: dict, env) -> list:
         },
         "shadow": False,
         "topLevel": False
-    })] + value
+    })]
 
 
 def _data_changevariableby(node: dict, env) -> list:
     var_or_list, var_id = resolve_var_or_list(node["name"], env)
-    value = scratchify(node["value"], env)
+    value = yield node["value"]
     _assign_parent(node["id"], value)
     if var_or_list == "var":
         return [(node["id"], {
@@ -563,7 +672,7 @@ def _data_changevariableby(node: dict, env) -> list:
             },
             "shadow": False,
             "topLevel": False
-        })] + value
+        })]
     return [(node["id"], {
         "opcode": "data_addtolist",
         "next": None,
@@ -576,12 +685,12 @@ def _data_changevariableby(node: dict, env) -> list:
         },
         "shadow": False,
         "topLevel": False
-    })] + value
+    })]
 
 
 def _data_itemoflist(node: dict, env) -> list:
     list_id = resolve_list(node["name"], env)
-    index = scratchify(node["INDEX"], env)
+    index = yield node["INDEX"]
     _assign_parent(node["id"], index)
     return [(node["id"], {
         "opcode": "data_itemoflist",
@@ -595,12 +704,12 @@ def _data_itemoflist(node: dict, env) -> list:
         },
         "shadow": False,
         "topLevel": False
-    })] + index
+    })]
 
 
 def _procedures_call(node: dict, env) -> list:
     proc = resolve_proc(node["name"], env)
-    args = [scratchify(i, env) for i in node["args"]]
+    args = yield node["args"]
     _assign_parent(node["id"], *args)
     call = [(node["id"], {
         "opcode": "procedures_call",
@@ -608,7 +717,7 @@ def _procedures_call(node: dict, env) -> list:
         "parent": None,
         "inputs": {
             i: _number_input(j)
-            for i, j in zip(proc["prototype"][1]["inputs"], args)},
+            for i, j in zip(proc["argument_ids"], args)},
         "fields": {},
         "shadow": False,
         "topLevel": False,
@@ -616,19 +725,33 @@ def _procedures_call(node: dict, env) -> list:
             "tagName": "mutation",
             "children": [],
             "proccode": node["name"] + " %s" * len(proc["params"]),
-            "argumentids": str(proc["prototype"][1]["inputs"]) \
-                    .replace("'", "\""),
+            "argumentids": str(proc["argument_ids"]).replace("'", "\""),
             "warp": proc["warp"]}})]
-    return sum(args, call)
+    return call
 
 
 def _ident(node: dict, env) -> list:
+    if node["name"] in env.get("params", ()):
+        # Identifiers don't get IDs, but every use of a parameter is a block
+        block = (env["context"].new_id(), {
+            "opcode": "argument_reporter_string_number",
+            "next": None,
+            "parent": None,
+            "inputs": {},
+            "fields": {
+                "VALUE": [node["name"], None]
+            },
+            "shadow": False,
+            "topLevel": False
+        })
+        env["blocks"][block[0]] = block[1]
+        return [block]
     var_or_list, var_id = resolve_var_or_list(node["name"], env)
     return [[[12 if var_or_list == "var" else 13, node["name"], var_id]]]
 
 
 def _control_wait(node: dict, env) -> list:
-    duration = scratchify(node["DURATION"], env)
+    duration = yield node["DURATION"]
     _assign_parent(node["id"], duration)
     return [(node["id"], {
         "opcode": "control_wait",
@@ -640,11 +763,11 @@ def _control_wait(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + duration
+    })]
 
 
 def _control_wait_until(node: dict, env) -> list:
-    condition = scratchify(node["CONDITION"], env)
+    condition = yield node["CONDITION"]
     _assign_parent(node["id"], condition)
     return [(node["id"], {
         "opcode": "control_wait_until",
@@ -656,11 +779,11 @@ def _control_wait_until(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + condition
+    })]
 
 
 def _looks_say(node: dict, env) -> list:
-    message = scratchify(node["MESSAGE"], env)
+    message = yield node["MESSAGE"]
     _assign_parent(node["id"], message)
     return [(node["id"], {
         "opcode": "looks_say",
@@ -672,12 +795,12 @@ def _looks_say(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + message
+    })]
 
 
 def _looks_sayforsecs(node: dict, env) -> list:
-    message = scratchify(node["MESSAGE"], env)
-    secs = scratchify(node["SECS"], env)
+    message = yield node["MESSAGE"]
+    secs = yield node["SECS"]
     _assign_parent(node["id"], message, secs)
     return [(node["id"], {
         "opcode": "looks_sayforsecs",
@@ -690,11 +813,11 @@ def _looks_sayforsecs(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + message + secs
+    })]
 
 
 def _sensing_askandwait(node: dict, env) -> list:
-    question = scratchify(node["QUESTION"], env)
+    question = yield node["QUESTION"]
     _assign_parent(node["id"], question)
     return [(node["id"], {
         "opcode": "sensing_askandwait",
@@ -706,11 +829,11 @@ def _sensing_askandwait(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + question
+    })]
 
 
 def _operator_round(node: dict, env) -> list:
-    num = scratchify(node["NUM"], env)
+    num = yield node["NUM"]
     _assign_parent(node["id"], num)
     return [(node["id"], {
         "opcode": "operator_round",
@@ -722,7 +845,7 @@ def _operator_round(node: dict, env) -> list:
         "fields": {},
         "shadow": False,
         "topLevel": False
-    })] + num
+    })]
 
 
 def _member_proc_call(node: dict, env) -> list:
@@ -749,7 +872,7 @@ arguments but {len(node['args'])} were provided")
         def append(list_id, args):
             expect_args(1)
 
-            value = scratchify(args[0], env)
+            value = yield args[0]
             _assign_parent(node["id"], value)
             return [(node["id"], {
                 "opcode": "data_addtolist",
@@ -763,7 +886,7 @@ arguments but {len(node['args'])} were provided")
                 },
                 "shadow": False,
                 "topLevel": False
-            })] + value
+            })]
 
         def clear(list_id, _):
             expect_args(0)
@@ -780,11 +903,30 @@ arguments but {len(node['args'])} were provided")
                 "topLevel": False
             })]
 
+        def delete(list_id, args):
+            expect_args(1)
+
+            index = yield args[0]
+            _assign_parent(node["id"], index)
+            return [(node["id"], {
+                "opcode": "data_deleteoflist",
+                "next": None,
+                "parent": None,
+                "inputs": {
+                    "INDEX": _number_input(index)
+                },
+                "fields": {
+                    "LIST": [node["caller"], list_id]
+                },
+                "shadow": False,
+                "topLevel": False
+            })]
+
         def insert(list_id, args):
             expect_args(2)
 
-            index = scratchify(args[0], env)
-            value = scratchify(args[1], env)
+            index = yield args[0]
+            value = yield args[1]
             _assign_parent(node["id"], value, index)
             return [(node["id"], {
                 "opcode": "data_insertatlist",
@@ -799,41 +941,42 @@ arguments but {len(node['args'])} were provided")
                 },
                 "shadow": False,
                 "topLevel": False
-            })] + value + index
+            })]
 
         return {
             "append": append,
             "clear": clear,
+            "delete": delete,
             "insert": insert,
         }.get(node["name"], unknown_proc)(caller, node["args"])
 
     return None
 
 
-def _program(node: dict, env):
+def assign_ids(node: dict, context):
+    """Gives every variable and list in a program an ID. This has to be done
+    before any target is scratchified, since targets can refer to the
+    variables and lists of the stage."""
     for var in node["stage"]["variables"]:
-        var["id"] = next(id_maker)
+        var["id"] = context.new_id()
     for lst in node["stage"]["lists"]:
-        lst["id"] = next(id_maker)
+        lst["id"] = context.new_id()
     for spr in node["sprites"]:
         for var in spr["variables"]:
-            var["id"] = next(id_maker)
+            var["id"] = context.new_id()
         for lst in spr["lists"]:
-            lst["id"] = next(id_maker)
+            lst["id"] = context.new_id()
 
-    stage = scratchify(node["stage"], {
-        "stage": node["stage"],
-        "sprite": node["stage"]
-    })
 
-    targets = [
-        stage, *(scratchify(spr, {
-            "stage": node["stage"],
-            "sprite": spr,
-            "index": i
-        }) for i, spr in enumerate(node["sprites"]))
-    ]
+def scratchify_target(target: dict, stage: dict, index, context) -> dict:
+    """Scratchifies the stage (if index is None) or the sprite with the
+    specified index. Targets only depend on each other through the IDs given
+    by assign_ids, so they can be scratchified in any order or in parallel."""
+    return scratchify(target, context.target_env(stage, target, index))
+
 
+def make_project(targets: list) -> dict:
+    """Returns the contents of project.json for scratchified targets."""
     return {
         "targets": targets,
         "monitors": [],
@@ -845,6 +988,20 @@ def _program(node: dict, env):
     }
 
 
+def _program(node: dict, env):
+    context = env["context"]
+    assign_ids(node, context)
+
+    stage = scratchify_target(node["stage"], node["stage"], None, context)
+
+    targets = [
+        stage, *(scratchify_target(spr, node["stage"], i, context)
+                 for i, spr in enumerate(node["sprites"]))
+    ]
+
+    return make_project(targets)
+
+
 SCRATCHIFY_DICT = {
     "operator_add": _bin_numeric_op("operator_add"),
     "operator_subtract": _bin_numeric_op("operator_subtract"),
@@ -859,6 +1016,10 @@ SCRATCHIFY_DICT = {
     "operator_not": _operator_not,
     "operator_random": _operator_random,
     "operator_join": _operator_join,
+    "operator_length": _block_inputs("operator_length", "STRING"),
+    "operator_contains": _block_inputs("operator_contains", "STRING1",
+                                       "STRING2"),
+    "mathop": _block_inputs("operator_mathop", "NUM", fields=("OPERATOR", )),
     "procedures_definition": _procedures_definition,
     "procedures_call": _procedures_call,
     "control_if": _control_if,
@@ -901,15 +1062,67 @@ SCRATCHIFY_DICT = {
 }
 
 
-def scratchify(tree, env=None) -> list:
-    """Converts an AST into a valid object for the project.json file in a
-    scratch project."""
+# Types of nodes that aren't blocks, so they don't get an ID
+_UNNUMBERED = ("stage_def", "sprite_def", "ident", "program")
+
+
+def _scratchify_list(items: list):
+    results = []
+    for item in items:
+        results.append((yield item))
+    return results
+
+
+def _visit(tree, env, stack: list):
+    """Starts scratchifying tree. Handlers that scratchify children are
+    generators that yield each child and receive its blocks in return. They
+    are pushed onto the stack and None is returned, otherwise the result is
+    returned directly."""
     if isinstance(tree, dict):
-        if tree["type"] not in ("stage_def", "sprite_def", "ident", "program"):
-            tree["id"] = next(id_maker)
-        return SCRATCHIFY_DICT[tree["type"]](tree, env)
+        if tree["type"] not in _UNNUMBERED:
+            tree["id"] = env["context"].new_id()
+            # Reserve the position of the block so that parents come before
+            # their children in project.json
+            env["blocks"][tree["id"]] = None
+        blocks = SCRATCHIFY_DICT[tree["type"]](tree, env)
+        if isinstance(blocks, GeneratorType):
+            stack.append((tree, blocks))
+            return None
+        return _store_blocks(tree, blocks, env)
+    if isinstance(tree, list):
+        stack.append((None, _scratchify_list(tree)))
+        return None
     if isinstance(tree, (int, float)):
         return [[[4, tree]]]
     if isinstance(tree, str):
         return [[[10, tree]]]
     return tree
+
+
+def _store_blocks(tree, blocks, env):
+    if tree is not None and tree["type"] not in _UNNUMBERED:
+        for block in blocks:
+            if isinstance(block, tuple):
+                env["blocks"][block[0]] = block[1]
+    return blocks
+
+
+def scratchify(tree, env=None) -> list:
+    """Converts an AST into a valid object for the project.json file in a
+    scratch project. When called without an environment, a new CompileContext
+    is used, so every compilation starts from the same IDs. The AST is walked
+    with an explicit stack, so deeply nested ASTs can be scratchified."""
+    if env is None:
+        env = {"context": CompileContext()}
+    stack = []
+    result = _visit(tree, env, stack)
+    while stack:
+        node, handler = stack[-1]
+        try:
+            child = handler.send(result)
+        except StopIteration as stop:
+            stack.pop()
+            result = _store_blocks(node, stop.value, env)
+            continue
+        result = _visit(child, env, stack)
+    return result
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""This module contains a compile server that keeps the parser loaded between
+compilations, and a client for it. The server listens on a Unix socket and
+compiles the programs it receives with a pool of worker processes.
+
+Every message is a JSON header followed by a binary payload, each prefixed
+with its length. A request has the header {"source": ..., "asset_dir": ...}
+and no payload, and the response has the header {"ok": true} and the .sb3
+file as its payload, or the header {"ok": false, "error": ...}."""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import build_cache, procedure_cache
+from compiler import AssetDirectory, compile_source
+from parse import get_parser
+
+# How often, in seconds, the server evicts old entries from its caches
+PRUNE_INTERVAL = 60 * 60
+
+
+def default_socket_path() -> str:
+    """Returns the socket path used if none is specified."""
+    return os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+        "scratch-compiler.sock")
+
+
+def _send(file, header: dict, payload=b""):
+    header = json.dumps(header).encode("utf8")
+    file.write(len(header).to_bytes(4, "big") + header)
+    file.write(len(payload).to_bytes(8, "big") + payload)
+    file.flush()
+
+
+def _read_exactly(file, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return data
+
+
+def _receive(file):
+    header_size = int.from_bytes(_read_exactly(file, 4), "big")
+    header = json.loads(_read_exactly(file, header_size))
+    payload_size = int.from_bytes(_read_exactly(file, 8), "big")
+    return header, _read_exactly(file, payload_size)
+
+
+def _compile_job(source_code: str, asset_dir, options):
+    # Errors are turned into strings here, since not all of them can be sent
+    # back from the worker process
+    try:
+        assets = AssetDirectory(asset_dir) if asset_dir else None
+        return True, compile_source(source_code, assets, options=options)
+    except Exception as error:  # pylint: disable=broad-except
+        return False, f"{type(error).__name__}: {error}"
+
+
+class _CompileHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            header, _ = _receive(self.rfile)
+        except (ConnectionError, ValueError):
+            return
+        try:
+            ok, result = self.server.executor.submit(
+                _compile_job, header["source"], header.get("asset_dir"),
+                self.server.options).result()
+        except Exception as error:  # pylint: disable=broad-except
+            ok, result = False, f"{type(error).__name__}: {error}"
+        if ok:
+            _send(self.wfile, {"ok": True}, result)
+        else:
+            _send(self.wfile, {"ok": False, "error": result})
+
+
+class _CompileServer(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    daemon_threads = True
+    options = {}
+    pruned = 0.0
+
+    def prune(self):
+        """Evicts old entries from the caches in the options."""
+        self.pruned = time.monotonic()
+        for key in ("procedure_cache", "build_cache"):
+            if key in self.options:
+                self.options[key].prune()
+
+    def service_actions(self):
+        # Called by serve_forever between requests
+        if time.monotonic() - self.pruned >= PRUNE_INTERVAL:
+            self.prune()
+
+
+def _init_worker():
+    # The workers are stopped by the server when it shuts down, so they
+    # don't inherit its signal handlers, which would print tracebacks
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    get_parser()
+
+
+def _bind(socket_path: str) -> _CompileServer:
+    # The socket is created with the permissions left by the umask, so only
+    # the user can connect to it from the moment it exists
+    umask = os.umask(0o177)
+    try:
+        return _CompileServer(socket_path, _CompileHandler)
+    finally:
+        os.umask(umask)
+
+
+def serve(socket_path: str, workers=None, options=None):
+    """Serves compile requests on a Unix socket until interrupted. Every worker
+    process loads the parser once, when it is started. The caches in options
+    are pruned every PRUNE_INTERVAL seconds and when the server stops."""
+    try:
+        os.remove(socket_path)
+    except FileNotFoundError:
+        pass
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker) as executor, \
+            _bind(socket_path) as server:
+        server.executor = executor
+        server.options = dict(options or {})
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+            server.prune()
+
+
+def compile_remote(source_code: str, asset_dir=None, socket_path=None) -> bytes:
+    """Compiles source code on a compile server and returns the contents of the
+    .sb3 file. Costumes are looked up in asset_dir by the server."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path or default_socket_path())
+        with connection.makefile("rwb") as file:
+            _send(
+                file, {
+                    "source":
+                    source_code,
+                    "asset_dir":
+                    asset_dir and os.path.abspath(asset_dir)
+                })
+            header, payload = _receive(file)
+    if not header["ok"]:
+        raise RuntimeError(header["error"])
+    return payload
+
+
+def _stop(*_):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    """Runs the server or the client, depending on the command line
+    arguments."""
+    arg_parser = argparse.ArgumentParser(
+        description="Compiles code into scratch projects on a compile server.")
+    arg_parser.add_argument("--socket",
+                            default=default_socket_path(),
+                            help="the path of the server's socket")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="start the server")
+    serve_parser.add_argument("-j",
+                              "--workers",
+                              type=int,
+                              help="the number of worker processes")
+    serve_parser.add_argument("--incremental",
+                              action="store_true",
+                              help="cache builds and procedures on disk")
+
+    compile_parser = subparsers.add_parser(
+        "compile", help="compile a file on a running server")
+    compile_parser.add_argument("source", help="the file to compile")
+    compile_parser.add_argument("-o",
+                                "--output",
+                                default="project.sb3",
+                                help="where to write the scratch project")
+
+    args = arg_parser.parse_args(argv)
+
+    if args.command == "serve":
+        options = {}
+        if args.incremental:
+            options["procedure_cache"] = procedure_cache()
+            options["build_cache"] = build_cache()
+        signal.signal(signal.SIGTERM, _stop)
+        try:
+            serve(args.socket, args.workers, options)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    with open(args.source) as source_file:
+        source_code = source_file.read()
+    project = compile_remote(source_code,
+                             os.path.dirname(os.path.abspath(args.source)),
+                             args.socket)
+    with open(args.output, "wb") as project_file:
+        project_file.write(project)
+
+
+if __name__ == "__main__":
+    main()
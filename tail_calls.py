@@ -0,0 +1,139 @@
+"""This module contains the eliminate_tail_calls function, which turns
+procedures that call themselves as the last thing they do into loops."""
+from cse import expression_children
+from effects import procedure_effects, reads
+from tree import add_temporary, walk
+
+
+def _tail_calls(proc: dict) -> list:
+    """Returns the (list, index) pairs of the calls of a procedure to itself
+    that are the last statement to run, or None if it also calls itself
+    anywhere else."""
+    tail_calls = []
+    stack = [proc["body"]]
+    while stack:
+        stmts = stack.pop()
+        if not stmts:
+            continue
+        last = stmts[-1]
+        if last["type"] == "procedures_call" and last["name"] == proc["name"]:
+            tail_calls.append((stmts, len(stmts) - 1))
+        elif last["type"] == "control_if":
+            stack.append(last["true_branch"])
+        elif last["type"] == "control_if_else":
+            stack.append(last["true_branch"])
+            stack.append(last["false_branch"])
+
+    calls = sum(1 for node in walk(proc["body"])
+                if node["type"] == "procedures_call"
+                and node["name"] == proc["name"])
+    return tail_calls if calls == len(tail_calls) else None
+
+
+def _rename(stmts: list, names: dict):
+    for node in walk(stmts):
+        for container, key in expression_children(node):
+            child = container[key]
+            if child["type"] == "ident" and child["name"] in names:
+                container[key] = {"type": "ident", "name": names[child["name"]]}
+
+
+def _reassign(call: dict, variables: list, again: str, target: dict) -> list:
+    """Returns the statements that replace a tail call. An argument is computed
+    into a temporary first if it reads a parameter that is assigned before
+    it."""
+    temporaries = []
+    assignments = []
+    assigned = set()
+    for variable, arg in zip(variables, call["args"]):
+        if isinstance(arg, dict) and arg == {"type": "ident", "name": variable}:
+            continue
+        if isinstance(arg, dict) and reads(arg) & assigned:
+            name = add_temporary(target, "tail")
+            temporaries.append({
+                "type": "data_setvariableto",
+                "name": name,
+                "value": arg
+            })
+            arg = {"type": "ident", "name": name}
+        assignments.append({
+            "type": "data_setvariableto",
+            "name": variable,
+            "value": arg
+        })
+        assigned.add(variable)
+    return temporaries + assignments + [{
+        "type": "data_setvariableto",
+        "name": again,
+        "value": 1
+    }]
+
+
+def _eliminate_in_procedure(proc: dict, tail_calls: list, target: dict):
+    # Parameters can't be changed, so their values are kept in temporaries
+    variables = [add_temporary(target, "tail") for _ in proc["params"]]
+    again = add_temporary(target, "tail")
+    _rename(proc["body"], {
+        param["name"]: variable
+        for param, variable in zip(proc["params"], variables)
+    })
+    for stmts, index in tail_calls:
+        stmts[index:] = _reassign(stmts[index], variables, again, target)
+
+    proc["body"] = [
+        *({
+            "type": "data_setvariableto",
+            "name": variable,
+            "value": {
+                "type": "ident",
+                "name": param["name"]
+            }
+        } for param, variable in zip(proc["params"], variables)),
+        {
+            "type": "data_setvariableto",
+            "name": again,
+            "value": 1
+        },
+        {
+            "type": "control_repeat_until",
+            "CONDITION": {
+                "type": "operator_equals",
+                "OPERAND1": {
+                    "type": "ident",
+                    "name": again
+                },
+                "OPERAND2": 0
+            },
+            "body": [{
+                "type": "data_setvariableto",
+                "name": again,
+                "value": 0
+            }, *proc["body"]]
+        },
+    ]
+
+
+def eliminate_tail_calls(target: dict) -> dict:
+    """Replaces the calls of procedures to themselves that are the last
+    statement they run with assignments to the parameters, and puts the body
+    in a loop that runs again after such a call. The parameters are kept in
+    temporary variables of the target, so only warp procedures that can't
+    wait and don't call themselves any other way are changed, since the
+    temporaries are shared by every call."""
+    effects = procedure_effects(target["procedures"])
+    for proc in target["procedures"]:
+        proc_effects = effects[proc["name"]]
+        if proc["warp"] != "true" or proc_effects["waits"] \
+                or proc["name"] not in proc_effects["calls"]:
+            continue
+        # Other procedures that call this one would overwrite the temporaries
+        if any(proc["name"] in effects[callee]["calls"]
+               for callee in proc_effects["calls"] - {proc["name"]}):
+            continue
+        tail_calls = _tail_calls(proc)
+        if not tail_calls or any(
+                len(stmts[index]["args"]) != len(proc["params"])
+                for stmts, index in tail_calls):
+            continue
+        _eliminate_in_procedure(proc, tail_calls, target)
+    return target
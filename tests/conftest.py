@@ -0,0 +1,27 @@
+"""The compiler's modules live in the root of the repository, so it is put on
+the import path for the tests. This module also has helpers for building the
+ASTs that the tests expect."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from parse import parse
+
+
+def first_sprite(source: str) -> dict:
+    """Parses source code and returns its first sprite."""
+    return parse(source)["sprites"][0]
+
+
+def ident(name: str) -> dict:
+    return {"type": "ident", "name": name}
+
+
+def set_variable(name: str, value) -> dict:
+    return {"type": "data_setvariableto", "name": name, "value": value}
+
+
+def say(message) -> dict:
+    return {"type": "looks_say", "MESSAGE": message}
@@ -0,0 +1,46 @@
+"""Tests for compiling many files at once."""
+import os
+
+from batch import compile_files, expand_sources, output_path, print_summary
+
+
+def _write_sources(tmp_path) -> tuple:
+    good = tmp_path / "good.scratch"
+    good.write_text("stage:\n\tdef main():\n\t\tsay(1)\n")
+    bad = tmp_path / "bad.scratch"
+    bad.write_text("stage:\n\tdef main():\n\t\tsay(missing)\n")
+    return str(good), str(bad)
+
+
+def test_sources_are_expanded_sorted_and_without_duplicates(tmp_path):
+    good, bad = _write_sources(tmp_path)
+    pattern = str(tmp_path / "*.scratch")
+    assert expand_sources([pattern, good, "other.scratch"]) \
+        == [bad, good, "other.scratch"]
+
+
+def test_failures_are_reported_and_do_not_stop_the_batch(tmp_path, capsys):
+    good, bad = _write_sources(tmp_path)
+    results = compile_files([bad, good])
+    assert [source for source, _, _ in results] == [bad, good]
+    assert results[0][2].startswith("NameError: ")
+    assert results[1][2] is None
+    assert os.path.exists(output_path(good))
+    assert not os.path.exists(output_path(bad))
+
+    assert print_summary(results, 1.0) == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith(bad)
+    assert "error: NameError: " in lines[0]
+    assert lines[1].startswith(good)
+    assert lines[1].endswith(f"-> {tmp_path / 'good.sb3'}")
+    assert lines[2] == "Compiled 1/2 files in 1.00s"
+
+
+def test_files_compiled_in_parallel_give_the_same_results(tmp_path):
+    good, bad = _write_sources(tmp_path)
+    results = compile_files([bad, good], jobs=2)
+    assert results[0][2].startswith("NameError: ")
+    assert results[1][2] is None
+    with open(output_path(good), "rb") as project_file:
+        assert project_file.read()
@@ -0,0 +1,107 @@
+"""Tests for compiling whole programs."""
+import io
+import json
+import zipfile
+
+from cache import build_cache
+from compiler import compile_source
+
+SOURCE = """x : var
+
+stage:
+	def main():
+		x += 1
+		say(sqrt(x * x + 1))
+		say(sqrt(x * x + 1))
+
+sprite S:
+	def main():
+		say(sqrt(x * x + 1))
+		say(sqrt(x * x + 1))
+
+sprite T:
+	def main():
+		say(x)
+"""
+
+
+def test_output_does_not_depend_on_the_number_of_jobs():
+    options = {"opt_level": 2}
+    assert compile_source(SOURCE, jobs=1, options=options) \
+        == compile_source(SOURCE, jobs=2, options=options)
+
+
+def test_same_source_gives_identical_archives():
+    assert compile_source(SOURCE) == compile_source(SOURCE)
+
+
+def test_initial_values_are_stored_in_the_project():
+    sb3 = compile_source("""x : var = 5
+table : list = [1, "two"]
+
+stage:
+	def main():
+		x += 1
+		table.append(x)
+""")
+    with zipfile.ZipFile(io.BytesIO(sb3)) as archive:
+        project = json.loads(archive.read("project.json"))
+    stage = project["targets"][0]
+    assert list(stage["variables"].values()) == [["x", 5]]
+    assert list(stage["lists"].values()) == [["table", [1, "two"]]]
+
+
+def test_reports_are_printed_even_if_the_build_is_cached(
+        tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("SCRATCH_COMPILER_CACHE", str(tmp_path))
+    source = """unused : var
+
+stage:
+	def main():
+		say(1)
+"""
+    compile_source(source, options={"build_cache": build_cache()})
+    for _ in range(2):
+        compile_source(source,
+                       options={
+                           "build_cache": build_cache(),
+                           "report_removed": True,
+                           "time_passes": True
+                       })
+        err = capsys.readouterr().err
+        assert "Removed from Stage: variables unused" in err
+        assert "Passes for program:" in err
+
+
+def test_deeply_nested_expressions_are_compiled():
+    terms = " + x" * 10000
+    source = f"""x : var
+total : var
+
+stage:
+	def main():
+		x += 1
+		say(x{terms})
+		compute(2)
+		show(x{terms})
+		say(total)
+	def compute(n):
+		total = n{terms.replace("x", "n")}
+	def show(a):
+		say(a)
+"""
+    for opt_level in (1, 2):
+        sb3 = compile_source(source, options={"opt_level": opt_level})
+        with zipfile.ZipFile(io.BytesIO(sb3)) as archive:
+            project = json.loads(archive.read("project.json"))
+        blocks = project["targets"][0]["blocks"].values()
+        opcodes = [block["opcode"] for block in blocks]
+        assert opcodes.count("operator_add") >= 20000
+        # The call with constant arguments is replaced with what it sets
+        # total to, and the call to show is inlined at -O2
+        sets = [
+            block["fields"]["VARIABLE"][0] for block in blocks
+            if block["opcode"] == "data_setvariableto"
+        ]
+        assert sets.count("total") == 2
+        assert opcodes.count("procedures_call") == (opt_level == 1)
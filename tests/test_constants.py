@@ -0,0 +1,179 @@
+"""Tests for the propagate_constants and initialize_lists passes."""
+from conftest import ident, say, set_variable
+from constants import initialize_lists, propagate_constants
+from parse import parse
+
+
+def _bodies(target: dict) -> dict:
+    return {proc["name"]: proc["body"] for proc in target["procedures"]}
+
+
+SET_ONCE = """sprite S:
+	k : var
+	def main():
+		k = 1 + 1
+		say(k)
+		helper()
+	def helper():
+		say(k)
+"""
+
+
+def test_variable_set_once_is_replaced_after_the_write():
+    tree = propagate_constants(parse(SET_ONCE), {"entry_points": ["main"]})
+    bodies = _bodies(tree["sprites"][0])
+    assert bodies["main"][0] == say(2)
+    assert bodies["helper"] == [say(2)]
+
+
+def test_without_entry_points_only_the_same_procedure_is_replaced():
+    # Any procedure can be clicked, so helper can run before main
+    tree = propagate_constants(parse(SET_ONCE), {})
+    bodies = _bodies(tree["sprites"][0])
+    assert bodies["main"][:2] == [set_variable("k", 2), say(2)]
+    assert bodies["helper"] == [say(ident("k"))]
+
+
+def test_variable_that_is_never_set_is_replaced_with_its_initial_value():
+    tree = propagate_constants(
+        parse("""k : var = 7
+z : var
+
+sprite S:
+	def main():
+		say(k)
+		say(z)
+"""), {})
+    assert _bodies(tree["sprites"][0])["main"] == [say(7), say(0)]
+
+
+def test_read_before_the_write_is_left_alone():
+    tree = propagate_constants(
+        parse("""sprite S:
+	k : var
+	def main():
+		say(k)
+		k = 2
+		say(k)
+"""), {})
+    assert _bodies(tree["sprites"][0])["main"] == [
+        say(ident("k")),
+        set_variable("k", 2),
+        say(2),
+    ]
+
+
+def test_callee_that_is_also_called_before_the_write_is_left_alone():
+    tree = propagate_constants(
+        parse("""sprite S:
+	k : var
+	def main():
+		helper()
+		k = 2
+		helper()
+	def helper():
+		say(k)
+"""), {"entry_points": ["main"]})
+    assert _bodies(tree["sprites"][0])["helper"] == [say(ident("k"))]
+
+
+def test_entry_points_are_never_assumed_to_run_after_the_write():
+    source = """sprite S:
+	k : var
+	def main():
+		k = 2
+		helper()
+	def helper():
+		say(k)
+"""
+    tree = propagate_constants(parse(source), {"entry_points": ["helper"]})
+    assert _bodies(tree["sprites"][0])["helper"] == [say(ident("k"))]
+    tree = propagate_constants(parse(source),
+                               {"entry_points": ["S.helper"]})
+    assert _bodies(tree["sprites"][0])["helper"] == [say(ident("k"))]
+
+
+def test_stage_variable_written_in_another_sprite_is_left_alone():
+    tree = propagate_constants(
+        parse("""g : var
+
+sprite A:
+	def main():
+		say(g)
+
+sprite B:
+	def main():
+		g = 5
+		say(g)
+"""), {})
+    assert _bodies(tree["sprites"][0])["main"] == [say(ident("g"))]
+    assert _bodies(tree["sprites"][1])["main"] == [
+        set_variable("g", 5),
+        say(5),
+    ]
+
+
+def test_sprite_variables_shadow_stage_variables():
+    tree = propagate_constants(
+        parse("""v : var = 1
+
+sprite S:
+	v : var
+	def main():
+		v = 3
+		say(v)
+
+sprite T:
+	def main():
+		say(v)
+"""), {})
+    assert _bodies(tree["sprites"][0])["main"] == [say(3)]
+    assert _bodies(tree["sprites"][1])["main"] == [say(1)]
+
+
+def _fill(before="", after="") -> str:
+    return f"""sprite S:
+	table : list
+	def main():
+{before}		table.clear()
+		table.append(1)
+		table.append("two")
+{after}		helper()
+	def helper():
+		say(table[2])
+"""
+
+
+def test_list_filled_with_constants_gets_the_items_as_initial_value():
+    tree = initialize_lists(parse(_fill()), {"entry_points": ["main"]})
+    sprite = tree["sprites"][0]
+    assert sprite["lists"][0]["value"] == [1, "two"]
+    assert _bodies(sprite)["main"] == [{
+        "type": "procedures_call",
+        "name": "helper",
+        "args": []
+    }]
+
+
+def test_list_read_before_the_last_append_is_left_alone():
+    source = _fill(after="\t\tsay(table[1])\n\t\ttable.append(3)\n")
+    tree = initialize_lists(parse(source), {"entry_points": ["main"]})
+    assert tree == parse(source)
+
+
+def test_list_appended_to_later_is_left_alone():
+    source = _fill(after="\t\tsay(1)\n\t\ttable.append(3)\n")
+    tree = initialize_lists(parse(source), {"entry_points": ["main"]})
+    assert tree == parse(source)
+
+
+def test_list_read_before_it_is_filled_is_left_alone():
+    source = _fill(before="\t\thelper()\n")
+    tree = initialize_lists(parse(source), {"entry_points": ["main"]})
+    assert tree == parse(source)
+
+
+def test_list_read_by_a_procedure_that_can_be_clicked_is_left_alone():
+    # Without entry points, helper can be clicked before main fills the list
+    tree = initialize_lists(parse(_fill()), {})
+    assert tree == parse(_fill())
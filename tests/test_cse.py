@@ -0,0 +1,51 @@
+"""Tests for the eliminate_common_subexpressions pass."""
+from conftest import first_sprite, ident
+from cse import eliminate_common_subexpressions
+
+
+def test_repeated_expression_is_computed_once():
+    sprite = eliminate_common_subexpressions(
+        first_sprite("""x : var
+
+sprite S:
+	def main():
+		say(x * x + 1)
+		say(x * x + 1)
+"""))
+    body = sprite["procedures"][0]["body"]
+    assert body[0]["type"] == "data_setvariableto"
+    assert body[0]["name"] == "cse.0"
+    assert body[1]["MESSAGE"] == body[2]["MESSAGE"] == ident("cse.0")
+    assert [var["name"] for var in sprite["variables"]] == ["cse.0"]
+
+
+def test_value_is_not_reused_after_a_write_to_what_it_reads():
+    sprite = eliminate_common_subexpressions(
+        first_sprite("""x : var
+
+sprite S:
+	def main():
+		say(x * x + 1)
+		x = 3
+		say(x * x + 1)
+"""))
+    body = sprite["procedures"][0]["body"]
+    assert [stmt["type"] for stmt in body] == [
+        "looks_say", "data_setvariableto", "looks_say"
+    ]
+    assert body[0]["MESSAGE"]["type"] == body[2]["MESSAGE"]["type"] \
+        == "operator_add"
+    assert sprite["variables"] == []
+
+
+def test_value_is_not_reused_after_a_wait():
+    sprite = eliminate_common_subexpressions(
+        first_sprite("""x : var
+
+sprite S:
+	def main():
+		say(x * x + 1)
+		wait(1)
+		say(x * x + 1)
+"""))
+    assert sprite["variables"] == []
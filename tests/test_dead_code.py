@@ -0,0 +1,82 @@
+"""Tests for the eliminate_dead_code pass."""
+from conftest import ident, say
+from dead_code import eliminate_dead_code
+
+
+def _procedure(body: list) -> dict:
+    return {"procedures": [{"type": "procedures_definition", "body": body}]}
+
+
+def _body(target: dict) -> list:
+    return target["procedures"][0]["body"]
+
+
+def test_statements_after_forever_are_removed():
+    forever = {"type": "control_forever", "body": [say(1)]}
+    target = eliminate_dead_code(_procedure([say(0), forever, say(2)]))
+    assert _body(target) == [say(0), forever]
+
+
+def test_statements_left_as_none_by_folding_are_removed():
+    target = eliminate_dead_code(_procedure([None, say(1), None]))
+    assert _body(target) == [say(1)]
+
+
+def test_empty_ifs_and_repeats_are_removed():
+    target = eliminate_dead_code(
+        _procedure([
+            {
+                "type": "control_if",
+                "CONDITION": ident("x"),
+                "true_branch": [None]
+            },
+            {
+                "type": "control_repeat",
+                "TIMES": 10,
+                "body": [{
+                    "type": "control_if",
+                    "CONDITION": ident("x"),
+                    "true_branch": []
+                }]
+            },
+            say(1),
+        ]))
+    assert _body(target) == [say(1)]
+
+
+def test_empty_while_loops_are_kept():
+    loop = {"type": "control_while", "CONDITION": ident("x"), "body": []}
+    assert _body(eliminate_dead_code(_procedure([loop]))) == [loop]
+
+
+def test_if_else_with_empty_true_branch_becomes_negated_if():
+    target = eliminate_dead_code(
+        _procedure([{
+            "type": "control_if_else",
+            "CONDITION": ident("x"),
+            "true_branch": [],
+            "false_branch": [say(1)]
+        }]))
+    assert _body(target) == [{
+        "type": "control_if",
+        "CONDITION": {
+            "type": "operator_not",
+            "OPERAND": ident("x")
+        },
+        "true_branch": [say(1)]
+    }]
+
+
+def test_if_else_with_empty_false_branch_becomes_if():
+    target = eliminate_dead_code(
+        _procedure([{
+            "type": "control_if_else",
+            "CONDITION": ident("x"),
+            "true_branch": [say(1)],
+            "false_branch": [None]
+        }]))
+    assert _body(target) == [{
+        "type": "control_if",
+        "CONDITION": ident("x"),
+        "true_branch": [say(1)]
+    }]
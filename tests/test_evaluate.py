@@ -0,0 +1,80 @@
+"""Tests for the evaluate_calls pass."""
+from conftest import first_sprite, set_variable
+from evaluate import evaluate_calls
+
+SUM = """sprite S:
+	total : var
+	i : var
+	def main():
+		sum_to(%s)
+	def sum_to(n):
+		total = 0
+		i = 0
+		repeat n:
+			i += 1
+			total += i
+"""
+
+
+def test_call_with_constant_arguments_is_replaced_by_its_results():
+    sprite = evaluate_calls(first_sprite(SUM % 4))
+    assert sprite["procedures"][0]["body"] == [
+        set_variable("total", 10), set_variable("i", 4)
+    ]
+
+
+def test_repeat_rounds_the_number_of_repetitions():
+    sprite = evaluate_calls(first_sprite(SUM % 2.5))
+    assert sprite["procedures"][0]["body"] == [
+        set_variable("total", 6), set_variable("i", 3)
+    ]
+    sprite = evaluate_calls(first_sprite(SUM % 2.4))
+    assert sprite["procedures"][0]["body"] == [
+        set_variable("total", 3), set_variable("i", 2)
+    ]
+
+
+def test_calls_over_the_budget_are_left_alone():
+    sprite = evaluate_calls(first_sprite(SUM % 100), 50)
+    assert sprite["procedures"][0]["body"][0]["type"] == "procedures_call"
+
+
+def test_calls_reading_a_variable_they_did_not_set_are_left_alone():
+    sprite = evaluate_calls(
+        first_sprite("""x : var
+
+sprite S:
+	y : var
+	def main():
+		double(2)
+	def double(n):
+		y = n * x
+"""))
+    assert sprite["procedures"][0]["body"][0]["type"] == "procedures_call"
+
+
+def test_temporaries_are_left_out():
+    sprite = first_sprite("""sprite S:
+	y : var
+	def main():
+		compute(2)
+	def compute(n):
+		y = n + 1
+		y = y * 2
+""")
+    sprite["procedures"][1]["body"][0]["name"] = "cse.0"
+    sprite["procedures"][1]["body"][1]["value"]["NUM1"]["name"] = "cse.0"
+    sprite = evaluate_calls(sprite)
+    assert sprite["procedures"][0]["body"] == [set_variable("y", 6)]
+
+
+def test_deeply_nested_expressions_are_evaluated():
+    source = """sprite S:
+	total : var
+	def main():
+		add_up(1)
+	def add_up(n):
+		total = n%s
+""" % (" + n" * 5000)
+    sprite = evaluate_calls(first_sprite(source))
+    assert sprite["procedures"][0]["body"] == [set_variable("total", 5001)]
@@ -0,0 +1,69 @@
+"""Tests for the inline_procedures pass."""
+from conftest import first_sprite
+from inline import inline_procedures
+
+
+def test_call_to_small_procedure_is_replaced_by_its_body():
+    sprite = inline_procedures(
+        first_sprite("""sprite S:
+	def main():
+		helper(1)
+	def helper(a):
+		say(a)
+"""), 12)
+    assert sprite["procedures"][0]["body"] == [{
+        "type": "looks_say",
+        "MESSAGE": 1
+    }]
+
+
+def test_procedures_over_the_budget_are_not_inlined():
+    sprite = inline_procedures(
+        first_sprite("""sprite S:
+	def main():
+		helper(1)
+	def helper(a):
+		say(a)
+		say(a + 1)
+		say(a + 2)
+"""), 2)
+    assert sprite["procedures"][0]["body"][0]["type"] == "procedures_call"
+
+
+def test_recursive_procedures_are_not_inlined():
+    sprite = inline_procedures(
+        first_sprite("""sprite S:
+	def main():
+		count(3)
+	def count(n):
+		if n > 0:
+			count(n - 1)
+"""), 100)
+    assert sprite["procedures"][0]["body"][0]["type"] == "procedures_call"
+
+
+def test_nowarp_procedures_are_not_inlined_into_other_procedures():
+    sprite = inline_procedures(
+        first_sprite("""sprite S:
+	warp def main():
+		animate()
+	nowarp def animate():
+		move_steps(10)
+"""), 12)
+    assert sprite["procedures"][0]["body"][0]["type"] == "procedures_call"
+
+
+def test_deeply_nested_arguments_are_inlined():
+    source = """sprite S:
+	x : var
+	total : var
+	def main():
+		store(x%s)
+	def store(a):
+		total = a
+""" % (" + x" * 5000)
+    sprite = inline_procedures(first_sprite(source))
+    stmt = sprite["procedures"][0]["body"][0]
+    assert stmt["type"] == "data_setvariableto"
+    assert stmt["name"] == "total"
+    assert stmt["value"]["type"] == "operator_add"
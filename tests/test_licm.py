@@ -0,0 +1,50 @@
+"""Tests for the hoist_loop_invariants pass."""
+from conftest import first_sprite
+from licm import hoist_loop_invariants
+
+
+def test_invariant_expression_is_computed_before_the_loop():
+    sprite = hoist_loop_invariants(
+        first_sprite("""x : var
+
+sprite S:
+	y : var
+	warp def main():
+		repeat 10:
+			y += x * x + 1
+"""))
+    body = sprite["procedures"][0]["body"]
+    assert body[0]["type"] == "data_setvariableto"
+    assert body[0]["name"] == "licm.0"
+    assert body[1]["type"] == "control_repeat"
+    assert body[1]["body"][0]["value"] == {"type": "ident", "name": "licm.0"}
+
+
+def test_expression_that_reads_a_variable_changed_in_the_loop_stays():
+    sprite = hoist_loop_invariants(
+        first_sprite("""x : var
+
+sprite S:
+	y : var
+	warp def main():
+		repeat 10:
+			x += 1
+			y += x * x + 1
+"""))
+    body = sprite["procedures"][0]["body"]
+    assert [stmt["type"] for stmt in body] == ["control_repeat"]
+    assert body[0]["body"][1]["value"]["type"] == "operator_add"
+
+
+def test_loops_of_procedures_that_yield_are_left_alone():
+    sprite = hoist_loop_invariants(
+        first_sprite("""x : var
+
+sprite S:
+	y : var
+	def main():
+		repeat 10:
+			y += x * x + 1
+"""))
+    assert [stmt["type"] for stmt in sprite["procedures"][0]["body"]] \
+        == ["control_repeat"]
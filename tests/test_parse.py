@@ -0,0 +1,48 @@
+"""Tests for loading the parser."""
+import os
+
+import indenter
+import parse
+
+
+class ChangedIndenter(indenter.ScratchIndenter):
+    """An indenter with different source code than ScratchIndenter."""
+    tab_len = 4
+
+
+def _cache_files(tmp_path) -> list:
+    return sorted(os.listdir(tmp_path / "parser"))
+
+
+def test_parser_tables_are_cached_and_reused(tmp_path, monkeypatch):
+    monkeypatch.setenv("SCRATCH_COMPILER_CACHE", str(tmp_path))
+    parse._build_parser()
+    [cache_file] = _cache_files(tmp_path)
+    os.utime(tmp_path / "parser" / cache_file, (0, 0))
+
+    parser = parse._build_parser()
+    assert _cache_files(tmp_path) == [cache_file]
+    assert os.stat(tmp_path / "parser" / cache_file).st_mtime == 0
+    assert parser.parse("stage:\n\tdef main():\n\t\tsay(1)\n")
+
+
+def test_parser_tables_are_rebuilt_when_the_grammar_changes(
+        tmp_path, monkeypatch):
+    monkeypatch.setenv("SCRATCH_COMPILER_CACHE", str(tmp_path / "cache"))
+    parse._build_parser()
+    grammar_file = tmp_path / "grammar.lark"
+    with open(parse.GRAMMAR_FILE) as original:
+        grammar_file.write_text(original.read() + "\n// changed\n")
+    monkeypatch.setattr(parse, "GRAMMAR_FILE", str(grammar_file))
+
+    parse._build_parser()
+    assert len(_cache_files(tmp_path / "cache")) == 2
+
+
+def test_parser_tables_are_rebuilt_when_the_indenter_changes(
+        tmp_path, monkeypatch):
+    monkeypatch.setenv("SCRATCH_COMPILER_CACHE", str(tmp_path))
+    parse._build_parser()
+    monkeypatch.setattr(indenter, "ScratchIndenter", ChangedIndenter)
+    parse._build_parser()
+    assert len(_cache_files(tmp_path)) == 2
@@ -0,0 +1,26 @@
+"""Tests for the pass manager."""
+from passes import run_passes
+
+
+def _add(tree, _):
+    if tree["added"] < 2:
+        tree["added"] += 1
+        tree["items"].append({"type": "item"})
+    return tree
+
+
+def _drop(tree, _):
+    tree["items"] = []
+    return tree
+
+
+def test_report_sums_the_changes_of_every_run(capsys):
+    tree = {"type": "root", "items": [], "added": 0}
+    run_passes(tree, [("add", _add, 1), ("drop", _drop, 1)], {
+        "opt_level": 2,
+        "time_passes": True
+    }, "test")
+    lines = capsys.readouterr().err.splitlines()
+    assert lines[2].split()[1] == "3"
+    assert lines[2].split()[-1] == "+2"
+    assert lines[3].split()[-1] == "-2"
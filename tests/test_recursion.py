@@ -0,0 +1,37 @@
+"""Tests for the lower_recursion pass."""
+from conftest import first_sprite
+from recursion import lower_recursion
+from tree import walk
+
+
+def test_recursive_procedure_keeps_its_arguments_on_lists():
+    sprite = lower_recursion(
+        first_sprite("""sprite S:
+	warp def fib(n):
+		if n > 1:
+			fib(n - 1)
+			fib(n - 2)
+"""))
+    assert [lst["name"] for lst in sprite["lists"]] == ["rec.0", "rec.1"]
+    assert [var["name"] for var in sprite["variables"]] == ["rec.2"]
+    assert not any(node["type"] == "procedures_call"
+                   for node in walk(sprite["procedures"][0]["body"]))
+
+
+def test_calls_inside_loops_are_left_alone():
+    source = """sprite S:
+	warp def f(n):
+		repeat n:
+			f(n - 1)
+"""
+    assert lower_recursion(first_sprite(source)) == first_sprite(source)
+
+
+def test_procedures_that_are_not_warp_are_left_alone():
+    source = """sprite S:
+	def fib(n):
+		if n > 1:
+			fib(n - 1)
+			fib(n - 2)
+"""
+    assert lower_recursion(first_sprite(source)) == first_sprite(source)
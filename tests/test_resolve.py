@@ -0,0 +1,78 @@
+"""Tests for looking up names."""
+import pytest
+
+from resolve import (build_symbols, resolve_ident, resolve_list, resolve_proc,
+                     resolve_var, resolve_var_or_list)
+
+
+def _target(variables=(), lists=(), procedures=(), prefix="") -> dict:
+    return {
+        "variables": [{
+            "name": name,
+            "id": f"{prefix}{name}.{i}"
+        } for i, name in enumerate(variables)],
+        "lists": [{
+            "name": name,
+            "id": f"{prefix}{name}.list.{i}"
+        } for i, name in enumerate(lists)],
+        "procedures": [{
+            "name": name,
+            "params": [],
+            "warp": "false"
+        } for name in procedures],
+    }
+
+
+def _env(stage: dict, sprite: dict) -> dict:
+    return {"stage": stage, "sprite": sprite}
+
+
+def test_first_declaration_of_a_name_wins():
+    symbols = build_symbols(_target(), _target(["x", "x"], ["l", "l"]))
+    assert symbols["var"]["x"] == ("var", "x.0")
+    assert symbols["list"]["l"] == ("list", "l.list.0")
+
+
+def test_sprite_variables_shadow_lists_and_the_stage():
+    stage = _target(["a", "b"], ["a", "b", "c"], prefix="stage.")
+    sprite = _target(["a"], ["a", "b"])
+    env = _env(stage, sprite)
+    assert resolve_var_or_list("a", env) == ("var", "a.0")
+    assert resolve_var_or_list("b", env) == ("list", "b.list.1")
+    assert resolve_var_or_list("c", env) == ("list", "stage.c.list.2")
+    env = _env(stage, _target())
+    assert resolve_var_or_list("a", env) == ("var", "stage.a.0")
+    assert resolve_var("b", env) == "stage.b.1"
+    assert resolve_list("c", env) == "stage.c.list.2"
+
+
+def test_stage_is_the_last_name_checked():
+    stage = _target(prefix="stage.")
+    env = _env(stage, _target())
+    assert resolve_ident("stage", env) == ("stage", stage)
+    env = _env(_target(["stage"], prefix="stage."), _target())
+    assert resolve_ident("stage", env) == ("var", "stage.stage.0")
+    sprite = _target(procedures=["stage"])
+    env = _env(stage, sprite)
+    assert resolve_ident("stage", env) == ("proc", sprite["procedures"][0])
+    assert resolve_proc("stage", env) is sprite["procedures"][0]
+
+
+def test_lookups_are_recorded_in_resolved():
+    env = _env(_target(["x"]), _target())
+    env["resolved"] = {}
+    resolve_var("x", env)
+    assert env["resolved"] == {("var", "x"): ["var", "x.0"]}
+
+
+def test_missing_names_are_reported():
+    env = _env(_target(), _target())
+    for resolve, message in [
+        (resolve_var, "Variable 'x' does not exist"),
+        (resolve_list, "List 'x' does not exist"),
+        (resolve_var_or_list, "Variable or list 'x' does not exist"),
+        (resolve_proc, "Procedure 'x' does not exist"),
+        (resolve_ident, "Name 'x' is not defined"),
+    ]:
+        with pytest.raises(NameError, match=message):
+            resolve("x", env)
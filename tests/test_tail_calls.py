@@ -0,0 +1,56 @@
+"""Tests for the eliminate_tail_calls pass."""
+from conftest import first_sprite, ident, set_variable
+from tail_calls import eliminate_tail_calls
+
+
+def test_argument_reading_a_reassigned_parameter_uses_a_temporary():
+    sprite = eliminate_tail_calls(
+        first_sprite("""sprite S:
+	warp def f(a, b):
+		if a > 0:
+			f(a - 1, a + b)
+"""))
+    body = sprite["procedures"][0]["body"]
+    assert body[:3] == [
+        set_variable("tail.0", ident("a")),
+        set_variable("tail.1", ident("b")),
+        set_variable("tail.2", 1)
+    ]
+    loop = body[3]
+    assert loop["type"] == "control_repeat_until"
+    # a + b is computed before a is changed
+    assert loop["body"][1]["true_branch"] == [
+        set_variable(
+            "tail.3", {
+                "type": "operator_add",
+                "NUM1": ident("tail.0"),
+                "NUM2": ident("tail.1")
+            }),
+        set_variable(
+            "tail.0", {
+                "type": "operator_subtract",
+                "NUM1": ident("tail.0"),
+                "NUM2": 1
+            }),
+        set_variable("tail.1", ident("tail.3")),
+        set_variable("tail.2", 1),
+    ]
+
+
+def test_calls_that_are_not_last_are_left_alone():
+    source = """sprite S:
+	warp def f(a):
+		if a > 0:
+			f(a - 1)
+			say(a)
+"""
+    assert eliminate_tail_calls(first_sprite(source)) == first_sprite(source)
+
+
+def test_procedures_that_are_not_warp_are_left_alone():
+    source = """sprite S:
+	def f(a):
+		if a > 0:
+			f(a - 1)
+"""
+    assert eliminate_tail_calls(first_sprite(source)) == first_sprite(source)
@@ -0,0 +1,76 @@
+"""Tests for the remove_unused pass."""
+from parse import parse
+from tree import add_temporary
+from unused import remove_unused, remove_unused_temporaries
+
+
+def _names(items):
+    return [item["name"] for item in items]
+
+
+def test_mutually_recursive_procedures_are_kept_without_entry_points():
+    tree = parse("""counter : var
+unused : var
+
+stage:
+	def ping():
+		counter += 1
+		pong()
+	def pong():
+		ping()
+""")
+    tree = remove_unused(tree, {})
+    assert _names(tree["stage"]["procedures"]) == ["ping", "pong"]
+    assert _names(tree["stage"]["variables"]) == ["counter"]
+
+
+def test_unreachable_procedures_are_removed_with_entry_points():
+    tree = parse("""stage:
+	def main():
+		helper()
+	def helper():
+		say(1)
+	def ping():
+		pong()
+	def pong():
+		ping()
+""")
+    tree = remove_unused(tree, {"entry_points": ["main"]})
+    assert _names(tree["stage"]["procedures"]) == ["main", "helper"]
+
+
+def test_sprite_entry_points_and_stage_variables():
+    tree = parse("""score : var
+lives : var
+
+sprite Player:
+	speed : var
+	def main():
+		score += speed
+	def other():
+		lives += 1
+""")
+    tree = remove_unused(tree, {"entry_points": ["Player.main"]})
+    assert _names(tree["sprites"][0]["procedures"]) == ["main"]
+    assert _names(tree["sprites"][0]["variables"]) == ["speed"]
+    assert _names(tree["stage"]["variables"]) == ["score"]
+
+
+def test_temporaries_that_are_no_longer_used_are_removed():
+    sprite = parse("""sprite S:
+	def main():
+		say(1)
+""")["sprites"][0]
+    add_temporary(sprite, "cse")
+    used = add_temporary(sprite, "cse")
+    sprite["procedures"][0]["body"].append({
+        "type": "looks_say",
+        "MESSAGE": {
+            "type": "ident",
+            "name": used
+        }
+    })
+    sprite = remove_unused_temporaries(sprite)
+    assert _names(sprite["variables"]) == ["cse.1"]
+    # A new temporary doesn't get the name of one that is still declared
+    assert add_temporary(sprite, "cse") == "cse.2"
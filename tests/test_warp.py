@@ -0,0 +1,60 @@
+"""Tests for the infer_warp pass."""
+from conftest import first_sprite
+from passes import optimize_target
+from warp import infer_warp
+
+
+def test_only_procedures_that_never_need_a_frame_become_warp():
+    sprite = infer_warp(
+        first_sprite("""sprite S:
+	def computes():
+		say(1)
+	def waits():
+		wait(1)
+	def calls_waits():
+		waits()
+	nowarp def opted_out():
+		say(1)
+	def runs_forever():
+		forever:
+			say(1)
+"""))
+    assert {proc["name"]: proc["warp"] for proc in sprite["procedures"]} == {
+        "computes": "true",
+        "waits": "false",
+        "calls_waits": "false",
+        "opted_out": "false",
+        "runs_forever": "false",
+    }
+
+
+def test_loop_polling_a_variable_it_never_changes_is_not_warp():
+    sprite = infer_warp(
+        first_sprite("""done : var
+
+sprite S:
+	def waits_for_others():
+		while done == 0:
+			say(1)
+"""))
+    assert sprite["procedures"][0]["warp"] == "false"
+
+
+NOWARP = """sprite S:
+	def main():
+		animate()
+	nowarp def animate():
+		repeat 10:
+			move_steps(10)
+"""
+
+
+def test_procedures_that_call_nowarp_procedures_are_not_warp():
+    sprite = infer_warp(first_sprite(NOWARP))
+    assert [proc["warp"] for proc in sprite["procedures"]] == ["false", "false"]
+
+
+def test_nowarp_procedures_stay_out_of_warp_at_o2():
+    sprite = optimize_target(first_sprite(NOWARP), {"opt_level": 2})
+    assert [proc["warp"] for proc in sprite["procedures"]] == ["false", "false"]
+    assert sprite["procedures"][0]["body"][0]["type"] == "procedures_call"
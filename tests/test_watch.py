@@ -0,0 +1,27 @@
+"""Tests for the incremental builds of the watch mode."""
+from watch import IncrementalBuilder
+
+SOURCE = """x : var
+
+stage:
+	def main():
+		x += 1
+		say(sqrt(x * x + 1))
+		say(sqrt(x * x + 1))
+
+sprite S:
+	def main():
+		say(x)
+"""
+
+
+def test_unchanged_targets_are_not_compiled_again(tmp_path):
+    source = tmp_path / "program.scratch"
+    source.write_text(SOURCE)
+    builder = IncrementalBuilder(str(source), str(tmp_path / "project.sb3"),
+                                 {"opt_level": 2})
+    assert [builder.build()["compiled"] for _ in range(3)] == [2, 0, 0]
+    stage = next(target for target in builder.targets.values()
+                 if target["isStage"])
+    assert any(name.startswith("cse.")
+               for name, _ in stage["variables"].values())
@@ -2,6 +2,8 @@
 transformer by the parser."""
 from re import sub
 from lark import Transformer
+from builtin import FUNCTIONS, PROCEDURES
+from optimize import optimize
 
 
 def expect_at_least_args(name, count, provided):
@@ -11,6 +13,40 @@ def expect_at_least_args(name, count, provided):
 {provided} were provided")
 
 
+def _constant(name, expression):
+    """Returns the value of the initializer of a variable or list, which has
+    to be a constant."""
+    value = optimize(expression)
+    if isinstance(value, dict):
+        raise ValueError(f"Initial value of '{name}' is not a constant")
+    return value
+
+
+def _join(args):
+    """Joins the arguments with a balanced tree of operator_join nodes. The
+    tree is built with an explicit stack, since there can be many arguments."""
+    results = []
+    stack = [(0, len(args), False)]
+    while stack:
+        low, high, visited = stack.pop()
+        if high - low == 1:
+            results.append(args[low])
+        elif visited:
+            string2 = results.pop()
+            string1 = results.pop()
+            results.append({
+                "type": "operator_join",
+                "STRING1": string1,
+                "STRING2": string2
+            })
+        else:
+            middle = low + (high - low) // 2
+            stack.append((low, high, True))
+            stack.append((middle, high, False))
+            stack.append((low, middle, False))
+    return results[0]
+
+
 class ScratchTransformer(Transformer):  # pylint: disable=too-few-public-methods
     """This class is used as a transformer when parsing source code that will be
     compiled to scratch."""
@@ -30,10 +66,12 @@ class ScratchTransformer(Transformer):  # pylint: disable=too-few-public-methods
                 "procedures":
                 stages[0]["procedures"] if stages else [],
                 "variables": [{
-                    "name": i["name"]
+                    "name": i["name"],
+                    "value": i["value"]
                 } for i in args if i["type"] == "var_decl"],
                 "lists": [{
-                    "name": i["name"]
+                    "name": i["name"],
+                    "value": i["value"]
                 } for i in args if i["type"] == "list_decl"]
             },
             "sprites": [i for i in args if i["type"] == "sprite_def"]
@@ -74,10 +112,12 @@ class ScratchTransformer(Transformer):  # pylint: disable=too-few-public-methods
             "costumes":
             costume_lists[0]["costumes"] if costume_lists else [],
             "variables": [{
-                "name": i["name"]
+                "name": i["name"],
+                "value": i["value"]
             } for i in args if i["type"] == "var_decl"],
             "lists": [{
-                "name": i["name"]
+                "name": i["name"],
+                "value": i["value"]
             } for i in args if i["type"] == "list_decl"],
             "procedures":
             [i for i in args if i["type"] == "procedures_definition"]
@@ -109,6 +149,10 @@ class ScratchTransformer(Transformer):  # pylint: disable=too-few-public-methods
     def _proc_def_warp(args):
         return {**args[0], "warp": "true"}
 
+    @staticmethod
+    def _proc_def_nowarp(args):
+        return {**args[0], "nowarp": True}
+
     @staticmethod
     def _param_list(args):
         return {
@@ -121,233 +165,30 @@ class ScratchTransformer(Transformer):  # pylint: disable=too-few-public-methods
 
     @staticmethod
     def _func_call(args):
-        call = {"name": args[0]["name"], "args": args[1]["args"]}
-
-        def expect_args(count):
-            if count != len(call["args"]):
-                raise TypeError(f"Function {call['name']}() expected {count} \
-arguments but {len(call['args'])} were provided")
-
-        def unary_math_func(name, operator=None):
-            def generated_func(node):
-                expect_args(1)
-                return {
-                    "type": "mathop",
-                    "OPERATOR": operator or name,
-                    "NUM": node["args"][0]
-                }
-
-            return generated_func
-
-        def unknown_func(node):
-            raise Exception(f"The function {node['name']} does not exist")
-
-        def random(node):
-            expect_args(2)
-            return {
-                "type": "operator_random",
-                "FROM": node["args"][0],
-                "TO": node["args"][1]
-            }
-
-        def length(node):
-            expect_args(1)
-            return {"type": "operator_length", "STRING": node["args"][0]}
-
-        def join(node):
-            expect_at_least_args("join", 2, len(node["args"]))
-
-            def join_(args):
-                if len(args) == 1:
-                    return args[0]
-                return {
-                    "type": "operator_join",
-                    "STRING1": join_(args[:len(args) // 2]),
-                    "STRING2": join_(args[len(args) // 2:])
-                }
-
-            return join_(node["args"])
-
-        def contains(node):
-            expect_args(2)
-            return {
-                "type": "operator_contains",
-                "STRING1": node["args"][0],
-                "STRING2": node["args"][1]
-            }
-
-        def answer(_):
-            expect_args(0)
-            return {
-                "type": "sensing_answer",
-            }
-
-        def timer(_):
-            expect_args(0)
-            return {
-                "type": "sensing_timer",
-            }
-
-        def username(_):
-            expect_args(0)
-            return {
-                "type": "sensing_username",
-            }
-
-        def mousex(_):
-            expect_args(0)
-            return {
-                "type": "sensing_mousex",
-            }
-
-        def mousey(_):
-            expect_args(0)
-            return {
-                "type": "sensing_mousey",
-            }
-
-        def round_(node):
-            expect_args(1)
-            return {"type": "operator_round", "NUM": node["args"][0]}
-
-        return {
-            "abs": unary_math_func("abs"),
-            "floor": unary_math_func("floor"),
-            "ceiling": unary_math_func("ceiling"),
-            "sqrt": unary_math_func("sqrt"),
-            "sin": unary_math_func("sin"),
-            "cos": unary_math_func("cos"),
-            "tan": unary_math_func("tan"),
-            "asin": unary_math_func("asin"),
-            "acos": unary_math_func("acos"),
-            "atan": unary_math_func("atan"),
-            "ln": unary_math_func("ln"),
-            "log": unary_math_func("log"),
-            "exp": unary_math_func("exp", "e ^"),
-            "pow": unary_math_func("pow", "10 ^"),
-            "random": random,
-            "join": join,
-            "contains": contains,
-            "length": length,
-            "answer": answer,
-            "timer": timer,
-            "username": username,
-            "mouse_x": mousex,
-            "mouse_y": mousey,
-            "round": round_,
-        }.get(call["name"], unknown_func)(call)
+        name = args[0]["name"]
+        call_args = args[1]["args"]
+        if name == "join":
+            expect_at_least_args("join", 2, len(call_args))
+            return _join(call_args)
+        if name not in FUNCTIONS:
+            raise Exception(f"The function {name} does not exist")
+        node_type, inputs, fields = FUNCTIONS[name]
+        if len(inputs) != len(call_args):
+            raise TypeError(f"Function {name}() expected {len(inputs)} \
+arguments but {len(call_args)} were provided")
+        return {"type": node_type, **fields, **dict(zip(inputs, call_args))}
 
     @staticmethod
     def _procedures_call(args):
-        call = {
-            "type": "procedures_call",
-            "name": args[0]["name"],
-            "args": args[1]["args"]
-        }
-
-        def expect_args(count):
-            if count != len(call["args"]):
-                raise TypeError(f"Procedure {call['name']}() expected {count} \
-arguments but {len(call['args'])} were provided")
-
-        def move_steps(node):
-            expect_args(1)
-            return {"type": "motion_movesteps", "STEPS": node["args"][0]}
-
-        def go_to_xy(node):
-            expect_args(2)
-            return {
-                "type": "motion_gotoxy",
-                "X": node["args"][0],
-                "Y": node["args"][1]
-            }
-
-        def turn_right(node):
-            expect_args(1)
-            return {"type": "motion_turnright", "DEGREES": node["args"][0]}
-
-        def turn_left(node):
-            expect_args(1)
-            return {"type": "motion_turnleft", "DEGREES": node["args"][0]}
-
-        def point_in_direction(node):
-            expect_args(1)
-            return {
-                "type": "motion_pointindirection",
-                "DIRECTION": node["args"][0]
-            }
-
-        def glide_secs_to_xy(node):
-            expect_args(3)
-            return {
-                "type": "motion_glidesecstoxy",
-                "X": node["args"][0],
-                "Y": node["args"][1],
-                "SECS": node["args"][2]
-            }
-
-        def if_on_edge_bounce(_):
-            expect_args(0)
-            return {"type": "motion_ifonedgebounce"}
-
-        def wait(node):
-            expect_args(1)
-            return {"type": "control_wait", "DURATION": node["args"][0]}
-
-        def wait_until(node):
-            expect_args(1)
-            return {"type": "control_wait_until", "CONDITION": node["args"][0]}
-
-        def say(node):
-            expect_args(1)
-            return {"type": "looks_say", "MESSAGE": node["args"][0]}
-
-        def say_seconds(node):
-            expect_args(2)
-            return {
-                "type": "looks_sayforsecs",
-                "MESSAGE": node["args"][0],
-                "SECS": node["args"][1]
-            }
-
-        def ask(node):
-            expect_args(1)
-            return {"type": "sensing_askandwait", "QUESTION": node["args"][0]}
-
-        def pen_down(_):
-            expect_args(0)
-            return {"type": "pen_pendown"}
-
-        def pen_up(_):
-            expect_args(0)
-            return {"type": "pen_penup"}
-
-        def stamp(_):
-            expect_args(0)
-            return {"type": "pen_stamp"}
-
-        def erase_all(_):
-            expect_args(0)
-            return {"type": "pen_eraseall"}
-
-        return {
-            "move_steps": move_steps,
-            "go_to_xy": go_to_xy,
-            "turn_right": turn_right,
-            "turn_left": turn_left,
-            "point_in_direction": point_in_direction,
-            "glide_to_xy": glide_secs_to_xy,
-            "if_on_edge_bounce": if_on_edge_bounce,
-            "wait": wait,
-            "wait_until": wait_until,
-            "say": say,
-            "say_for_seconds": say_seconds,
-            "ask": ask,
-            "pen_down": pen_down,
-            "pen_up": pen_up,
-            "stamp": stamp,
-            "erase_all": erase_all,
-        }.get(call["name"], lambda x: x)(call)
+        name = args[0]["name"]
+        call_args = args[1]["args"]
+        if name not in PROCEDURES:
+            return {"type": "procedures_call", "name": name, "args": call_args}
+        node_type, inputs = PROCEDURES[name]
+        if len(inputs) != len(call_args):
+            raise TypeError(f"Procedure {name}() expected {len(inputs)} \
+arguments but {len(call_args)} were provided")
+        return {"type": node_type, **dict(zip(inputs, call_args))}
 
     @staticmethod
     def _member_func_call(args):
@@ -369,9 +210,11 @@ arguments but {len(call['args'])} were provided")
 
     @staticmethod
     def _number(args):
-        float_val = float(args[0])
-        int_val = int(args[0])
-        return int_val if int_val == float_val else float_val
+        try:
+            return int(args[0])
+        except ValueError:
+            float_val = float(args[0])
+            return int(float_val) if float_val.is_integer() else float_val
 
     @staticmethod
     def _string(args):
@@ -451,11 +294,21 @@ arguments but {len(call['args'])} were provided")
 
     @staticmethod
     def _var_decl(args):
-        return {"type": "var_decl", "name": args[0]["name"]}
+        name = args[0]["name"]
+        return {
+            "type": "var_decl",
+            "name": name,
+            "value": _constant(name, args[1]) if len(args) > 1 else 0
+        }
 
     @staticmethod
     def _list_decl(args):
-        return {"type": "list_decl", "name": args[0]["name"]}
+        name = args[0]["name"]
+        return {
+            "type": "list_decl",
+            "name": name,
+            "value": [_constant(name, item) for item in args[1:]]
+        }
 
     @staticmethod
     def _list_index(args):
@@ -467,28 +320,27 @@ arguments but {len(call['args'])} were provided")
 
     @staticmethod
     def _if_stmt(args):
-        def if_stmt(args):
-            if len(args) == 2:
-                return {
+        # The chain of elifs is built from the end, so that long chains don't
+        # need deep recursion
+        has_else = len(args) % 2 == 1
+        false_branch = args[-1]["stmts"] if has_else else None
+        node = None
+        for i in reversed(range(0, len(args) - has_else, 2)):
+            if false_branch is None:
+                node = {
                     "type": "control_if",
-                    "CONDITION": args[0],
-                    "true_branch": args[1]["stmts"]
+                    "CONDITION": args[i],
+                    "true_branch": args[i + 1]["stmts"]
                 }
-            if len(args) == 3:
-                return {
+            else:
+                node = {
                     "type": "control_if_else",
-                    "CONDITION": args[0],
-                    "true_branch": args[1]["stmts"],
-                    "false_branch": args[2]["stmts"]
+                    "CONDITION": args[i],
+                    "true_branch": args[i + 1]["stmts"],
+                    "false_branch": false_branch
                 }
-            return {
-                "type": "control_if_else",
-                "CONDITION": args[0],
-                "true_branch": args[1]["stmts"],
-                "false_branch": if_stmt(args[2:])
-            }
-
-        return if_stmt(args)
+            false_branch = [node]
+        return node
 
     @staticmethod
     def _var_eq(args):
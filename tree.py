@@ -0,0 +1,77 @@
+"""This module contains helpers for walking and rewriting ASTs without
+recursion."""
+
+# Maps the type of a statement to the keys of its statement lists
+STATEMENT_LISTS = {
+    "procedures_definition": ("body", ),
+    "control_if": ("true_branch", ),
+    "control_if_else": ("true_branch", "false_branch"),
+    "control_forever": ("body", ),
+    "control_while": ("body", ),
+    "control_repeat_until": ("body", ),
+    "control_repeat": ("body", ),
+}
+
+
+def walk(tree):
+    """Yields every node in an AST, parents before their children and
+    children in the order they appear in."""
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            yield item
+            stack.extend(reversed(item.values()))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+
+
+def copy_tree(tree):
+    """Returns a copy of an AST with new dicts and lists all the way down,
+    like copy.deepcopy but without recursion."""
+    root = [tree]
+    stack = [(root, 0)]
+    while stack:
+        container, key = stack.pop()
+        item = container[key]
+        if isinstance(item, dict):
+            item = container[key] = dict(item)
+            stack.extend((item, child) for child in item)
+        elif isinstance(item, list):
+            item = container[key] = list(item)
+            stack.extend((item, i) for i in range(len(item)))
+    return root[0]
+
+
+def statement_lists(stmts: list) -> list:
+    """Returns a (node, key) pair for every statement list in and below a list
+    of statements, such as the procedures of a target, where node[key] is the
+    list. Lists come before the lists nested in them."""
+    lists = []
+    stack = list(reversed(stmts))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict) and node["type"] in STATEMENT_LISTS:
+            for key in STATEMENT_LISTS[node["type"]]:
+                lists.append((node, key))
+            for key in reversed(STATEMENT_LISTS[node["type"]]):
+                stack.extend(reversed(node[key]))
+    return lists
+
+
+def add_temporary(target: dict, kind: str, key="variables") -> str:
+    """Declares a new variable (or list, if key is "lists") in a target for a
+    value computed by the compiler and returns its name. The name contains a
+    dot, so it can't be the same as a name in the source code."""
+    names = {item["name"] for item in (*target["variables"], *target["lists"])}
+    # Temporaries that are no longer used can have been removed, so the
+    # number of temporaries isn't always a free number
+    count = sum(1 for name in names if name.startswith(f"{kind}."))
+    while f"{kind}.{count}" in names:
+        count += 1
+    name = f"{kind}.{count}"
+    target[key].append({
+        "name": name,
+        "id": f"{target.get('name', 'Stage')}.{name}"
+    })
+    return name
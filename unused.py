@@ -0,0 +1,119 @@
+"""This module contains the remove_unused function, which removes the
+procedures, variables and lists that a program never uses, and the
+remove_unused_temporaries function, which removes the temporaries that the
+optimizer no longer uses."""
+import sys
+
+from tree import walk
+
+# Maps the type of a node to the key of the variable or list name it uses
+_NAME_KEYS = {
+    "ident": "name",
+    "data_setvariableto": "name",
+    "data_changevariableby": "name",
+    "data_itemoflist": "name",
+    "member_func_call": "caller",
+    "member_proc_call": "caller",
+}
+
+
+def _references(proc: dict):
+    """Returns the names of the procedures that a procedure calls and the
+    names of the variables and lists that it uses."""
+    calls = set()
+    names = set()
+    for node in walk(proc["body"]):
+        if node["type"] == "procedures_call":
+            calls.add(node["name"])
+        elif node["type"] in _NAME_KEYS:
+            names.add(node[_NAME_KEYS[node["type"]]])
+    return calls, names
+
+
+def is_entry_point(target_name: str, proc: dict, entry_points) -> bool:
+    """Returns whether a procedure of a target is one of the entry points,
+    given as "name" or "sprite.name"."""
+    return proc["name"] in entry_points \
+            or f"{target_name}.{proc['name']}" in entry_points
+
+
+def _reachable(target_name: str, procs: list, entry_points) -> tuple:
+    """Returns the procedures of a target that can be reached from its entry
+    points and the names they use. Without entry points, every procedure is
+    an entry point, since any of them can be run by clicking it."""
+    references = {proc["name"]: _references(proc) for proc in procs}
+    roots = [
+        proc["name"] for proc in procs if not entry_points
+        or is_entry_point(target_name, proc, entry_points)
+    ]
+
+    reached = set()
+    stack = roots
+    while stack:
+        name = stack.pop()
+        if name in reached or name not in references:
+            continue
+        reached.add(name)
+        stack.extend(references[name][0])
+
+    names = set()
+    for name in reached:
+        names |= references[name][1]
+    return reached, names
+
+
+def _keep(target: dict, key: str, used, options: dict):
+    """Removes the items of target[key] whose names aren't in used."""
+    removed = [item["name"] for item in target[key] if item["name"] not in used]
+    if removed and options.get("report_removed", False):
+        print(f"Removed from {target.get('name', 'Stage')}: {key} " +
+              ", ".join(removed),
+              file=sys.stderr)
+    target[key] = [item for item in target[key] if item["name"] in used]
+
+
+def remove_unused(tree: dict, options: dict) -> dict:
+    """Removes the procedures that can't be reached from the entry points in
+    options["entry_points"], and the variables and lists that no remaining
+    procedure uses. Entry points are given as "name" or "sprite.name", where
+    the stage is called "Stage". If options["report_removed"] is set, what
+    was removed is printed."""
+    entry_points = set(options.get("entry_points") or ())
+    stage = tree["stage"]
+
+    # Names used by a sprite that the sprite doesn't declare itself refer to
+    # the variables and lists of the stage
+    stage_used = set()
+    for target in (stage, *tree["sprites"]):
+        name = target.get("name", "Stage")
+        reached, used = _reachable(name, target["procedures"], entry_points)
+        _keep(target, "procedures", reached, options)
+        if target is stage:
+            stage_used |= used
+            continue
+        _keep(target, "variables", used, options)
+        _keep(target, "lists", used, options)
+        declared = {item["name"] for item in target["variables"]} \
+                | {item["name"] for item in target["lists"]}
+        stage_used |= used - declared
+
+    _keep(stage, "variables", stage_used, options)
+    _keep(stage, "lists", stage_used, options)
+    return tree
+
+
+def remove_unused_temporaries(target: dict) -> dict:
+    """Removes the temporaries of a target that none of its procedures use,
+    for example because the code that used them was folded away by a later
+    pass. Temporaries are only used by the target that declares them, since
+    their names contain a dot, so the target is all that has to be
+    searched."""
+    used = set()
+    for proc in target["procedures"]:
+        used |= _references(proc)[1]
+    for key in ("variables", "lists"):
+        target[key] = [
+            item for item in target[key]
+            if "." not in item["name"] or item["name"] in used
+        ]
+    return target
@@ -0,0 +1,55 @@
+"""This module contains the infer_warp function, which makes the procedures that
+never have to wait for the next frame run without screen refresh."""
+from cse import PURE_EXPRESSIONS
+from effects import procedure_effects, reads, statement_effects
+from tree import walk
+
+
+def _waits_for_others(loop: dict, effects: dict) -> bool:
+    """Returns whether a while or until loop waits for something that only
+    changes between frames, such as the timer, the mouse or a variable that
+    another script sets."""
+    if any(node["type"] not in PURE_EXPRESSIONS
+           for node in walk(loop["CONDITION"])):
+        return True
+    own = statement_effects(loop["body"])
+    writes = set(own["writes"])
+    for callee in own["calls"]:
+        callee_writes = effects.get(callee, {}).get("writes")
+        if callee_writes is None:
+            return True
+        writes |= callee_writes
+    return not reads(loop["CONDITION"]) & writes
+
+
+def _needs_frames(proc: dict, effects: dict) -> bool:
+    """Returns whether a procedure itself can run forever or wait for the next
+    frame. Procedures like that would freeze the screen if they were warp."""
+    for node in walk(proc["body"]):
+        if node["type"] == "control_forever":
+            return True
+        if node["type"] in ("control_while", "control_repeat_until") \
+                and _waits_for_others(node, effects):
+            return True
+    return False
+
+
+def infer_warp(target: dict) -> dict:
+    """Makes the procedures of a target that can't wait, run forever or poll
+    for something another script changes, and don't call procedures that
+    can, run without screen refresh. Procedures declared with nowarp, and
+    the procedures that call them, are left as they are."""
+    effects = procedure_effects(target["procedures"])
+    # The callees of a warp procedure run without screen refresh too, so
+    # calling a nowarp procedure needs frames like waiting does
+    needs_frames = {
+        proc["name"]
+        for proc in target["procedures"] if proc.get("nowarp")
+        or effects[proc["name"]]["waits"] or _needs_frames(proc, effects)
+    }
+    for proc in target["procedures"]:
+        if proc["warp"] == "true" or proc["name"] in needs_frames \
+                or effects[proc["name"]]["calls"] & needs_frames:
+            continue
+        proc["warp"] = "true"
+    return target
@@ -0,0 +1,118 @@
+"""This module contains the watch function, which recompiles a program every time
+its source code or costumes change."""
+import os
+import time
+
+from cache import tree_hash
+from compiler import AssetDirectory, add_costumes, compile_target, \
+costume_lists, shared_stage, write_sb3
+from context import CompileContext
+from parse import parse
+from passes import optimize_program
+from scratchify import assign_ids, make_project
+
+
+class IncrementalBuilder:
+    """Compiles a program again and again, keeping the parser and the compiled
+    targets in memory. A target is only compiled again if its own AST, its
+    position or the variables and lists of the stage have changed."""
+    def __init__(self, source: str, output: str, options=None):
+        self.source = source
+        self.output = output
+        self.options = dict(options or {})
+        self.assets = AssetDirectory(
+            os.path.dirname(os.path.abspath(source)))
+        self.targets = {}
+        self.watched = [source]
+
+    def _target_key(self, target: dict, stage: dict, index) -> str:
+        return tree_hash((target, stage["variables"], stage["lists"], index))
+
+    def build(self) -> dict:
+        """Compiles the program and returns the number of targets that were
+        compiled and the time spent in each phase."""
+        timings = {}
+        start = time.perf_counter()
+
+        with open(self.source) as source_file:
+            source_code = source_file.read()
+        tree = parse(source_code)
+        costumes = costume_lists(tree)
+        timings["parse"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tree = optimize_program(tree, self.options)
+        assign_ids(tree, CompileContext(self.options))
+        stage = tree["stage"]
+        shared = shared_stage(stage)
+        # Every key is computed before anything is compiled, since compiling
+        # a target adds its temporaries to it
+        jobs = [(target, stage if index is None else shared, index,
+                 self._target_key(target, shared, index))
+                for index, target in [(None, stage),
+                                      *enumerate(tree["sprites"])]]
+        targets = []
+        keys = []
+        compiled = 0
+        for target, target_stage, index, key in jobs:
+            if key not in self.targets:
+                self.targets[key] = compile_target(target, target_stage, index,
+                                                   self.options)
+                compiled += 1
+            keys.append(key)
+            # The costumes are filled in below, so every build needs its own
+            # copy of the target
+            targets.append(dict(self.targets[key]))
+        self.targets = {key: self.targets[key] for key in keys}
+        project = make_project(targets)
+        timings["compile"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        files = add_costumes(project, costumes, self.assets)
+        timings["assets"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sb3 = write_sb3(project, files)
+        with open(self.output, "wb") as project_file:
+            project_file.write(sb3)
+        timings["write"] = time.perf_counter() - start
+
+        self.watched = [
+            self.source,
+            *(os.path.join(self.assets.path, name) for names in costumes
+              for name in names)
+        ]
+        return {"compiled": compiled, "targets": len(keys), "timings": timings}
+
+    def snapshot(self) -> dict:
+        """Returns the modification times of the files used by the last
+        build."""
+        mtimes = {}
+        for file_name in self.watched:
+            try:
+                mtimes[file_name] = os.stat(file_name).st_mtime_ns
+            except OSError:
+                mtimes[file_name] = None
+        return mtimes
+
+
+def _report(result: dict):
+    phases = ", ".join(f"{phase} {seconds * 1000:.1f}ms"
+                       for phase, seconds in result["timings"].items())
+    total = sum(result["timings"].values())
+    print(f"Compiled {result['compiled']}/{result['targets']} targets in "
+          f"{total * 1000:.1f}ms ({phases})")
+
+
+def watch(source: str, output: str, options=None, interval=0.25):
+    """Compiles source to output every time the source file or one of the
+    costumes it uses changes. Runs until interrupted."""
+    builder = IncrementalBuilder(source, output, options)
+    while True:
+        try:
+            _report(builder.build())
+        except Exception as error:  # pylint: disable=broad-except
+            print(f"Error: {error}")
+        snapshot = builder.snapshot()
+        while builder.snapshot() == snapshot:
+            time.sleep(interval)